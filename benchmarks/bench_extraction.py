@@ -0,0 +1,104 @@
+"""
+Compares the MP3-on-disk extraction path against zero-disk PCM streaming.
+
+    python benchmarks/bench_extraction.py --minutes 10 --model base
+    python benchmarks/bench_extraction.py --minutes 10 --skip-transcribe
+
+Generates a deterministic synthetic video with ffmpeg's lavfi sources, then for
+each mode measures extraction alone (draining the producer) and, unless
+--skip-transcribe is given, extraction + local transcription. Prints JSON.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.transcription_service import TranscriptionService  # noqa: E402
+
+
+def make_media(ffmpeg_path, path, minutes):
+    seconds = int(minutes * 60)
+    subprocess.run([
+        ffmpeg_path, "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={seconds}",
+        "-f", "lavfi", "-i", f"testsrc=size=320x240:rate=10:duration={seconds}",
+        "-shortest", "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", path
+    ], check=True)
+
+
+def dir_size(path):
+    if not os.path.exists(path):
+        return 0
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def run_mode(service, media, workdir, mode, segment_time, model, transcribe):
+    chunks_dir = os.path.join(workdir, f"chunks_{mode}")
+    result = {"mode": mode}
+
+    start = time.perf_counter()
+    chunks = list(service.stream_audio_chunks(media, chunks_dir, segment_time, extraction_mode=mode))
+    result["extract_seconds"] = round(time.perf_counter() - start, 3)
+    result["chunks"] = len(chunks)
+    result["disk_bytes"] = dir_size(chunks_dir)
+    del chunks
+    shutil.rmtree(chunks_dir, ignore_errors=True)
+
+    if transcribe:
+        start = time.perf_counter()
+        stream = service.stream_audio_chunks(media, chunks_dir, segment_time, extraction_mode=mode)
+        output = service.transcribe_local(stream, model)
+        result["extract_and_transcribe_seconds"] = round(time.perf_counter() - start, 3)
+        result["text_chars"] = len(output["text"])
+        shutil.rmtree(chunks_dir, ignore_errors=True)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--segment-time", type=int, default=600)
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--skip-transcribe", action="store_true")
+    parser.add_argument("--output", help="guardar el JSON en este archivo")
+    args = parser.parse_args()
+
+    service = TranscriptionService()
+    workdir = tempfile.mkdtemp(prefix="bench_extraction_")
+    try:
+        media = os.path.join(workdir, "input.mp4")
+        make_media(service.ffmpeg_path, media, args.minutes)
+
+        if not args.skip_transcribe:
+            # Load the model up front so neither mode pays for it
+            from services.model_registry import get_model_registry
+            get_model_registry().get(args.model)
+
+        report = {
+            "minutes": args.minutes,
+            "segment_time": args.segment_time,
+            "model": None if args.skip_transcribe else args.model,
+            "results": [
+                run_mode(service, media, workdir, mode, args.segment_time, args.model, not args.skip_transcribe)
+                for mode in ("mp3", "pcm")
+            ]
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
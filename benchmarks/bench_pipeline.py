@@ -0,0 +1,330 @@
+"""
+End-to-end benchmark of the transcription pipeline, per stage.
+
+    python benchmarks/bench_pipeline.py --minutes 1 10 --model base
+    python benchmarks/bench_pipeline.py --minutes 60 120 --modes cloud --output after.json
+    python benchmarks/bench_pipeline.py --compare before.json after.json
+
+For each duration a deterministic synthetic video is generated offline with
+ffmpeg's lavfi sources (kept in --media-dir between runs). Then, for each mode:
+
+  * the TranscriptionService stages are run one after the other -- probe,
+    extraction, transcription, join (merge_chunks) and cleanup -- and
+  * the whole job is run through main.convert_and_transcribe with a
+    throw-away job database and transcript cache.
+
+Cloud mode talks to the local stub in stub_openai_server.py, never to the
+real API. Every measurement reports wall time, real-time factor (wall time /
+media duration), peak RSS of this process and its children (ffmpeg, worker
+processes) and CPU utilisation (CPU seconds / wall time / cores). Peak RSS of
+child processes needs psutil; without it only this process is sampled.
+
+The JSON report includes the git commit so runs can be compared with --compare.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Seconds between RSS samples while a stage runs
+SAMPLE_INTERVAL = 0.05
+
+
+def make_media(ffmpeg_path, path, minutes):
+    seconds = int(minutes * 60)
+    subprocess.run([
+        ffmpeg_path, "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={seconds}",
+        "-f", "lavfi", "-i", f"testsrc=size=320x240:rate=10:duration={seconds}",
+        "-shortest", "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", path
+    ], check=True)
+
+
+def _rss_bytes():
+    if psutil:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _cpu_seconds():
+    if psutil:
+        process = psutil.Process()
+        times = process.cpu_times()
+        total = times.user + times.system
+        for child in process.children(recursive=True):
+            try:
+                child_times = child.cpu_times()
+                total += child_times.user + child_times.system
+            except psutil.Error:
+                pass
+        # Children already reaped are only counted by the OS totals below
+        return total + getattr(times, "children_user", 0) + getattr(times, "children_system", 0)
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class StageMeter:
+    """
+    Measures wall time, CPU time and peak RSS of the code inside `with`.
+    """
+
+    def __init__(self, media_seconds):
+        self.media_seconds = media_seconds
+        self.result = {}
+        self._peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self._peak = max(self._peak, _rss_bytes())
+
+    def __enter__(self):
+        self._peak = _rss_bytes()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._cpu = _cpu_seconds()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._start
+        cpu = _cpu_seconds() - self._cpu
+        self._stop.set()
+        self._sampler.join()
+        self._peak = max(self._peak, _rss_bytes())
+        self.result = {
+            "wall_seconds": round(wall, 3),
+            "rtf": round(wall / self.media_seconds, 5) if self.media_seconds else None,
+            "peak_rss_mb": round(self._peak / (1024 * 1024), 1),
+            "cpu_seconds": round(cpu, 2),
+            "cpu_utilization": round(cpu / wall / (os.cpu_count() or 1), 3) if wall else None
+        }
+        return False
+
+
+def run_stages(service, media, workdir, seconds, mode, args):
+    """
+    TranscriptionService stages one at a time (no extraction/transcription overlap).
+    """
+    import ffmpeg
+    from services.transcript_merge import merge_chunks
+
+    chunks_dir = os.path.join(workdir, f"chunks_{mode}")
+    stages = {}
+
+    with StageMeter(seconds) as meter:
+        try:
+            ffmpeg.probe(media)
+            probe_error = None
+        except (ffmpeg.Error, OSError) as e:
+            probe_error = str(e)
+    stages["probe"] = dict(meter.result, error=probe_error) if probe_error else meter.result
+
+    with StageMeter(seconds) as meter:
+        chunks = list(service.stream_audio_chunks(
+            media, chunks_dir, args.segment_time, extraction_mode=args.extraction_mode, chunking=args.chunking
+        ))
+    stages["extraction"] = dict(meter.result, chunks=len(chunks))
+
+    results = []
+
+    def keep(chunk, text, segments):
+        results.append({"index": chunk.index, "start": chunk.start, "end": chunk.end, "text": text, "segments": segments})
+
+    with StageMeter(seconds) as meter:
+        if mode == "local":
+            service.transcribe_local(chunks, args.model, workers=args.workers, chunk_callback=keep)
+        else:
+            service.transcribe_cloud(chunks, max_in_flight=args.cloud_in_flight, chunk_callback=keep)
+    stages["transcription"] = meter.result
+
+    with StageMeter(seconds) as meter:
+        results.sort(key=lambda r: r["index"])
+        merge_chunks(results)
+    stages["join"] = meter.result
+
+    with StageMeter(seconds) as meter:
+        del chunks
+        shutil.rmtree(chunks_dir, ignore_errors=True)
+    stages["cleanup"] = meter.result
+    return stages
+
+
+def run_end_to_end(app, media, workdir, seconds, mode):
+    """
+    The whole job through convert_and_transcribe, as the server runs it.
+    """
+    job_id = f"bench-{mode}-{int(seconds)}"
+    upload = os.path.join(workdir, f"{job_id}.mp4")
+    shutil.copyfile(media, upload)
+    app.job_store.create(job_id, status='queued', stage='starting', start_time=time.time(),
+                         file=upload, error=None, result=None, mode=mode)
+    # No cache hits between modes or repeated runs
+    shutil.rmtree(app.TRANSCRIPT_CACHE_DIR, ignore_errors=True)
+    os.makedirs(app.TRANSCRIPT_CACHE_DIR, exist_ok=True)
+
+    # The app's progress prints go to stderr so stdout stays valid JSON
+    with StageMeter(seconds) as meter, contextlib.redirect_stdout(sys.stderr):
+        app.convert_and_transcribe(job_id, upload, mode)
+    job = app.job_store.get(job_id)
+    return dict(meter.result, status=job['status'], error=job['error'], chunks=job.get('total_chunks'))
+
+
+def load_app(workdir, args):
+    # main reads its configuration from the environment at import time
+    os.environ.update({
+        "JOBS_DB": os.path.join(workdir, "jobs.db"),
+        "TRANSCRIPT_CACHE_DIR": os.path.join(workdir, "cache"),
+        # Benchmark jobs must not reach the real search archive or LLM cache
+        "TRANSCRIPTS_DB": os.path.join(workdir, "transcripts.db"),
+        "LLM_CACHE_DIR": os.path.join(workdir, "llm_cache"),
+        "WHISPER_MODEL": args.model,
+        "WHISPER_PRELOAD": "0",
+        "WHISPER_LOCAL_WORKERS": str(args.workers),
+        "SEGMENT_TIME": str(args.segment_time),
+        "EXTRACTION_MODE": args.extraction_mode,
+        "CHUNKING_MODE": args.chunking,
+        "CLOUD_MAX_IN_FLIGHT": str(args.cloud_in_flight),
+    })
+    os.chdir(ROOT)
+    with contextlib.redirect_stdout(sys.stderr):
+        import main as app
+    return app
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+
+    def index(report):
+        rows = {}
+        for run in report["runs"]:
+            for stage, metrics in list(run["stages"].items()) + [("end_to_end", run["end_to_end"])]:
+                if metrics:
+                    rows[(run["minutes"], run["mode"], stage)] = metrics
+        return rows
+
+    old, new = index(before), index(after)
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    print(f"{'min':>6} {'modo':<6} {'etapa':<14} {'antes (s)':>10} {'después (s)':>12} {'cambio':>8}")
+    for key in sorted(set(old) & set(new)):
+        a, b = old[key]["wall_seconds"], new[key]["wall_seconds"]
+        change = f"{(b - a) / a * 100:+.1f}%" if a else "-"
+        print(f"{key[0]:>6} {key[1]:<6} {key[2]:<14} {a:>10.3f} {b:>12.3f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10])
+    parser.add_argument("--modes", nargs="+", choices=["local", "cloud"], default=["local", "cloud"])
+    parser.add_argument("--model", default="base", help="modelo Whisper local (nombre o ruta .pt)")
+    parser.add_argument("--workers", type=int, default=1, help="procesos Whisper en modo local")
+    parser.add_argument("--segment-time", type=int, default=600)
+    parser.add_argument("--extraction-mode", choices=["mp3", "pcm"], default="mp3")
+    parser.add_argument("--chunking", choices=["fixed", "silence"], default="fixed")
+    parser.add_argument("--cloud-in-flight", type=int, default=4)
+    parser.add_argument("--stub-latency", type=float, default=0.5, help="segundos por petición al stub")
+    parser.add_argument("--media-dir", default=os.path.join(tempfile.gettempdir(), "bench_media"),
+                        help="carpeta donde se guardan los vídeos sintéticos entre ejecuciones")
+    parser.add_argument("--skip-e2e", action="store_true", help="solo etapas, sin convert_and_transcribe")
+    parser.add_argument("--output", help="guardar el JSON en este archivo")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DESPUES"), help="comparar dos informes JSON")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    from openai import OpenAI
+    from stub_openai_server import start_stub_server
+
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    stub, base_url, stub_config = start_stub_server(latency=args.stub_latency)
+    try:
+        app = None if args.skip_e2e else load_app(workdir, args)
+        from services.transcription_service import TranscriptionService
+        service = app.transcription_service if app else TranscriptionService()
+        service.client = OpenAI(api_key="stub", base_url=base_url)
+
+        if "local" in args.modes:
+            # Load the model up front so no measurement pays for it
+            if args.workers > 1:
+                service.get_parallel_transcriber(args.model, args.workers).warm_up()
+            else:
+                from services.model_registry import get_model_registry
+                get_model_registry().get(args.model)
+
+        os.makedirs(args.media_dir, exist_ok=True)
+        runs = []
+        for minutes in args.minutes:
+            media = os.path.join(args.media_dir, f"synthetic_{minutes:g}min.mp4")
+            if not os.path.exists(media):
+                print(f"Generando {media}...", file=sys.stderr)
+                make_media(service.ffmpeg_path, media, minutes)
+            seconds = minutes * 60
+            for mode in args.modes:
+                print(f"{minutes:g} min, {mode}...", file=sys.stderr)
+                run = {"minutes": minutes, "mode": mode, "stages": run_stages(service, media, workdir, seconds, mode, args)}
+                run["end_to_end"] = None if args.skip_e2e else run_end_to_end(app, media, workdir, seconds, mode)
+                runs.append(run)
+
+        report = {
+            "commit": git_commit(),
+            "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                        "cpus": os.cpu_count(), "psutil": psutil is not None},
+            "config": {k: v for k, v in vars(args).items() if k not in ("compare", "output", "media_dir")},
+            "stub_requests": stub_config.requests,
+            "runs": runs
+        }
+    finally:
+        stub.shutdown()
+        if app:
+            app.transcription_service.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+fp32 vs int8 (dynamically quantized) local Whisper on a fixed clip.
+
+    python benchmarks/bench_quantization.py --model base --output int8.json
+    python benchmarks/bench_quantization.py --clip clase.wav --reference clase.txt --repeat 3 --threads 4
+
+By default the clip is benchmarks/clips/clase_energia.mp3 (42 s of Spanish
+lecture speech) with its exact transcript, clase_energia.txt, as reference,
+so results are comparable across machines. The clip was synthesized from
+that text with espeak-ng 1.52 (voice "es", 150 words per minute) and
+encoded as 16 kHz mono MP3 at 32 kbit/s.
+
+Each precision runs in a fresh process (this script with --run), so peak RSS
+and the memory taken by the loaded model are not mixed up between them. The
+clip is decoded once per process and transcribed --repeat times through
+TranscriptionService.transcribe_local, after loading the model through the
+model registry, as the server does.
+
+Reported per precision: model load time, weight size, RSS added by the
+model, transcription wall time (best of the repeats), real-time factor, peak
+RSS and word error rate. WER is measured against --reference (a text file
+with the correct transcript); without one, the fp32 transcript is the
+reference, so its WER is 0 and the int8 WER is the difference between them
+(a --clip of your own is used without reference unless one is given).
+The summary gives the int8 speedup, memory savings and WER delta.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+import unicodedata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CLIPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "clips")
+DEFAULT_CLIP = os.path.join(CLIPS_DIR, "clase_energia.mp3")
+DEFAULT_REFERENCE = os.path.join(CLIPS_DIR, "clase_energia.txt")
+
+from bench_pipeline import StageMeter, _rss_bytes, git_commit  # noqa: E402
+
+
+def normalize(text):
+    """
+    Lowercase words without accents or punctuation, as compared by WER.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.findall(r"\w+", text)
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    (substitutions + deletions + insertions) / reference words, by edit distance over words.
+    """
+    ref, hyp = normalize(reference), normalize(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word)
+            ))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def run_precision(args):
+    """
+    Child process: load one precision, transcribe the clip, print JSON.
+    """
+    import torch
+    import whisper
+    from services.model_registry import get_model_registry, variant_name, _model_size_bytes
+    from services.pipeline import AudioChunk
+    from services.transcription_service import TranscriptionService
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    audio = whisper.load_audio(args.clip)
+    seconds = len(audio) / whisper.audio.SAMPLE_RATE
+    model_name = variant_name(args.model, args.run)
+
+    rss_before = _rss_bytes()
+    started = time.perf_counter()
+    model = get_model_registry().get(model_name)
+    load_seconds = time.perf_counter() - started
+    rss_model = _rss_bytes() - rss_before
+
+    service = TranscriptionService()
+    runs = []
+    for _ in range(args.repeat):
+        with StageMeter(seconds) as meter:
+            result = service.transcribe_local([AudioChunk(0, args.clip, 0.0, seconds, audio=audio)], model_name)
+        runs.append((meter.result, result["text"]))
+    best, text = min(runs, key=lambda run: run[0]["wall_seconds"])
+
+    return {
+        "precision": args.run,
+        "model": model_name,
+        "clip_seconds": round(seconds, 2),
+        "load_seconds": round(load_seconds, 2),
+        "weights_mb": round(_model_size_bytes(model) / (1024 * 1024), 1),
+        "model_rss_mb": round(rss_model / (1024 * 1024), 1),
+        "transcription": best,
+        "all_wall_seconds": [run[0]["wall_seconds"] for run in runs],
+        "text": text.strip()
+    }
+
+
+def measure(args, precision):
+    command = [sys.executable, os.path.abspath(__file__), "--run", precision, "--clip", args.clip,
+               "--model", args.model, "--repeat", str(args.repeat), "--threads", str(args.threads)]
+    # The child's progress prints go to stderr; its stdout is the JSON result
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(results, reference):
+    fp32, int8 = results["fp32"], results["int8"]
+    if reference is None:
+        reference = fp32["text"]
+    for result in results.values():
+        result["wer"] = round(word_error_rate(reference, result["text"]), 4)
+
+    def saving(key, path=None):
+        before = fp32[path][key] if path else fp32[key]
+        after = int8[path][key] if path else int8[key]
+        return round(1 - after / before, 3) if before else None
+
+    speedup = fp32["transcription"]["wall_seconds"] / int8["transcription"]["wall_seconds"]
+    return {
+        "speedup": round(speedup, 2),
+        "weights_saving": saving("weights_mb"),
+        "model_rss_saving": saving("model_rss_mb"),
+        "peak_rss_saving": saving("peak_rss_mb", "transcription"),
+        "wer_delta": round(int8["wer"] - fp32["wer"], 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clip", default=DEFAULT_CLIP, help="clip de audio o vídeo de prueba (siempre el mismo)")
+    parser.add_argument("--reference", help="archivo de texto con la transcripción correcta del clip "
+                                            "(por defecto, la del clip incluido)")
+    parser.add_argument("--model", default="base", help="modelo Whisper local (nombre o ruta .pt)")
+    parser.add_argument("--repeat", type=int, default=3, help="transcripciones por precisión (se toma la mejor)")
+    parser.add_argument("--threads", type=int, default=0, help="hilos de torch (0 = por defecto)")
+    parser.add_argument("--output", help="guardar el JSON en este archivo")
+    parser.add_argument("--run", choices=["fp32", "int8"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        sys.stdout, stdout = sys.stderr, sys.stdout
+        result = run_precision(args)
+        print(json.dumps(result, ensure_ascii=False), file=stdout)
+        return
+
+    reference = None
+    if args.reference is None and os.path.abspath(args.clip) == DEFAULT_CLIP:
+        args.reference = DEFAULT_REFERENCE
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            reference = f.read()
+
+    results = {}
+    for precision in ("fp32", "int8"):
+        print(f"{precision}...", file=sys.stderr)
+        results[precision] = measure(args, precision)
+
+    report = {
+        "commit": git_commit(),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "run")},
+        "summary": summarize(results, reference),
+        "results": results
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
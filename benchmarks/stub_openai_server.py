@@ -0,0 +1,144 @@
+"""
+Local stub of the OpenAI endpoints used by the app, for benchmarks and manual
+testing without network access or API costs.
+
+    python benchmarks/stub_openai_server.py --port 8787 --latency 0.5 --fail-rate 0.2
+
+Then point the client at it:
+    OpenAI(api_key="stub", base_url="http://127.0.0.1:8787/v1")
+or the whole app, through its configuration:
+    OPENAI_BASE_URL=http://127.0.0.1:8787/v1 python main.py
+
+Chat completions (stream=true included, as server-sent events) answer with a
+deterministic text built from the last message, so summaries and analyses
+can be exercised end to end.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubConfig:
+    def __init__(self, latency=0.2, fail_rate=0.0, retry_after=None):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.retry_after = retry_after
+        self.requests = 0
+        self.chat_requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        cfg = self.config
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        with cfg.lock:
+            cfg.requests += 1
+            cfg.in_flight += 1
+            cfg.max_in_flight = max(cfg.max_in_flight, cfg.in_flight)
+        try:
+            time.sleep(cfg.latency)
+
+            if random.random() < cfg.fail_rate:
+                status = random.choice([429, 500, 503])
+                headers = {"retry-after": str(cfg.retry_after)} if status == 429 and cfg.retry_after else {}
+                return self._send_json(status, {"error": {"message": "stub failure", "type": "stub"}}, headers)
+
+            if self.path.endswith("/audio/transcriptions"):
+                match = re.search(rb'filename="([^"]+)"', body)
+                name = match.group(1).decode("utf-8", "replace") if match else "audio"
+                return self._send_json(200, {"text": f"[{name}] {length} bytes"})
+
+            if self.path.endswith("/chat/completions"):
+                with cfg.lock:
+                    cfg.chat_requests += 1
+                request = json.loads(body or b"{}")
+                return self._chat_completion(request)
+
+            return self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+        finally:
+            with cfg.lock:
+                cfg.in_flight -= 1
+
+    def _chat_completion(self, request):
+        messages = request.get("messages", [])
+        last = str(messages[-1].get("content", "")) if messages else ""
+        words = last.split()
+        reply = f"[stub] {len(messages)} mensajes, {len(words)} palabras: {' '.join(words[:8])}"
+        model = request.get("model", "stub")
+        created = int(time.time())
+
+        if not request.get("stream"):
+            return self._send_json(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(last) // 4, "completion_tokens": len(reply) // 4,
+                          "total_tokens": (len(last) + len(reply)) // 4}
+            })
+
+        # One event per word; HTTP/1.0, so closing the connection ends the stream
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        parts = [{"role": "assistant", "content": ""}] + [{"content": word + " "} for word in reply.split()]
+        for n, delta in enumerate(parts + [{}]):
+            chunk = {
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": "stop" if n == len(parts) else None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stub_server(port=0, latency=0.2, fail_rate=0.0, retry_after=None):
+    """
+    Starts the stub in a background thread. Returns (server, base_url, config).
+    """
+    config = StubConfig(latency, fail_rate, retry_after)
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return server, base_url, config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub local de la API de OpenAI")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.2, help="segundos por petición")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fracción de respuestas 429/5xx")
+    parser.add_argument("--retry-after", type=float, default=None)
+    args = parser.parse_args()
+
+    server, base_url, _ = start_stub_server(args.port, args.latency, args.fail_rate, args.retry_after)
+    print(f"Stub escuchando en {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
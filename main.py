@@ -1,21 +1,131 @@
 import uvicorn
 import webbrowser
 import threading
+import multiprocessing
 import os
 import shutil
 import ffmpeg
-import whisper
 import uuid
+import hashlib
 import time
 import sys
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Form
+import math
+import asyncio
+import logging
+import json
+from urllib.parse import quote
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from pydantic import BaseModel
+from typing import Optional
+from dotenv import load_dotenv
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
-from openai import OpenAI
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, StreamingResponse, PlainTextResponse, Response
+from services.model_registry import get_model_registry, variant_name, PRECISIONS
+from services.transcription_service import TranscriptionService
+from services.transcript_cache import TranscriptCache, file_sha256, HASH_BLOCK_SIZE
+from services.job_store import JobStore
+from services.progress import ProgressBroker, format_sse
+from services.scheduler import JobScheduler, QueueFullError, PRIORITIES
+from services.ingest import StreamingIngest
+from services.media import is_supported, audio_stream, CLOUD_MAX_CHUNK_BYTES
+from services.eta import ThroughputModel, predict_queue_wait, DEFAULT_RTF
+from services.summarizer import MapReduceSummarizer
+from services.openai_clients import create_clients
+from services.ai_service import AIService
+from services.llm_cache import ResponseCache
+from services.search_index import TranscriptIndex
+from services.export_service import ExportService
+from services.retrieval import PassageIndexCache, is_question, format_passages, term_coverage, MIN_TERM_COVERAGE
+from services.metrics import REGISTRY, Gauge, STAGE_SECONDS, BYTES_PROCESSED, AUDIO_SECONDS, JOBS_FINISHED, stage_timer
+
+# Configuración desde .env (las variables de entorno ya definidas tienen prioridad)
+load_dotenv()
 
 # Configuración de OpenAI
-client = OpenAI(api_key="YOUR_API_KEY_HERE")  # Reemplaza con tu API key de OpenAI
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "YOUR_API_KEY_HERE")  # Reemplaza con tu API key de OpenAI
+# Un único par de clientes (sync y async) con conexiones persistentes para transcripción y chat
+client, async_client = create_clients(
+    OPENAI_API_KEY,
+    timeout=float(os.getenv("OPENAI_TIMEOUT", "120")),
+    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+    max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "32")),
+    max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "16")),
+    # Otro servidor compatible con OpenAI (p. ej. el stub local de benchmarks/)
+    base_url=os.getenv("OPENAI_BASE_URL") or None
+)
+
+# Configuración de modelos Whisper locales
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_PRELOAD = os.getenv("WHISPER_PRELOAD", "1") == "1"
+# Precisión por defecto del modo local: "fp32" o "int8" (capas lineales cuantizadas, más rápido en CPU)
+WHISPER_PRECISION = os.getenv("WHISPER_PRECISION", "fp32")
+model_registry = get_model_registry(
+    max_models=int(os.getenv("WHISPER_MAX_MODELS", "2")),
+    memory_budget_mb=int(os.getenv("WHISPER_MEMORY_BUDGET_MB", "0")) or None
+)
+
+# Duración de cada chunk (s) y chunks extraídos en espera de ser transcritos
+SEGMENT_TIME = int(os.getenv("SEGMENT_TIME", "600"))
+PIPELINE_MAX_PENDING = int(os.getenv("PIPELINE_MAX_PENDING", "4"))
+# Extracción: "mp3" (chunks en disco) o "pcm" (audio en memoria, sin archivos intermedios)
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "mp3")
+# Corte de chunks: "fixed" o "silence" (en pausas cerca de SEGMENT_TIME, omitiendo silencios largos;
+# siempre en memoria, por lo que ignora EXTRACTION_MODE, la copia directa del audio y CHUNK_OVERLAP)
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "fixed")
+# Detección de voz por energía: umbral (dBFS) y silencio mínimo (s) que se descarta
+# ("auto": ruido de fondo de la grabación + margen; o un valor fijo en dBFS)
+VAD_THRESHOLD_DB = None if os.getenv("VAD_THRESHOLD_DB", "auto") == "auto" else float(os.getenv("VAD_THRESHOLD_DB"))
+VAD_DROP_SILENCE = float(os.getenv("VAD_DROP_SILENCE", "2.0"))
+# Solape (s) entre chunks consecutivos con corte "fixed"; permite chunks cortos muy paralelos
+CHUNK_OVERLAP = float(os.getenv("CHUNK_OVERLAP", "0"))
+
+# Procesos paralelos para el modo local (1 = secuencial en este proceso)
+LOCAL_WORKERS = int(os.getenv("WHISPER_LOCAL_WORKERS", "1"))
+# Grupos de procesos (uno por modelo y precisión) que se mantienen a la vez; los inactivos sobrantes se cierran
+WHISPER_MAX_POOLS = int(os.getenv("WHISPER_MAX_POOLS", "1"))
+
+# Modo cloud: peticiones simultáneas a la API, timeout por petición y reintentos
+CLOUD_MAX_IN_FLIGHT = int(os.getenv("CLOUD_MAX_IN_FLIGHT", "4"))
+CLOUD_TIMEOUT = float(os.getenv("CLOUD_TIMEOUT", "120"))
+CLOUD_MAX_RETRIES = int(os.getenv("CLOUD_MAX_RETRIES", "5"))
+CLOUD_MODEL = os.getenv("CLOUD_MODEL", "whisper-1")
+
+# Caché persistente de transcripciones por contenido del archivo
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", os.path.join("cache", "transcripts"))
+TRANSCRIPT_CACHE_MAX_MB = int(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "512"))
+
+# Persistencia de trabajos (SQLite) y antigüedad máxima antes de eliminarlos
+JOBS_DB = os.getenv("JOBS_DB", os.path.join("data", "jobs.db"))
+# Archivo de transcripciones con búsqueda de texto completo (se conserva al purgar trabajos)
+TRANSCRIPTS_DB = os.getenv("TRANSCRIPTS_DB", os.path.join("data", "transcripts.db"))
+JOB_MAX_AGE_HOURS = float(os.getenv("JOB_MAX_AGE_HOURS", "72"))
+
+# Planificador: trabajos simultáneos por modo y máximo de trabajos en espera por modo
+SCHEDULER_LOCAL_WORKERS = int(os.getenv("SCHEDULER_LOCAL_WORKERS", "1"))
+SCHEDULER_CLOUD_WORKERS = int(os.getenv("SCHEDULER_CLOUD_WORKERS", "4"))
+SCHEDULER_MAX_QUEUED = int(os.getenv("SCHEDULER_MAX_QUEUED", "20"))
+
+# Segundos sin eventos antes de enviar un keepalive por el stream de progreso
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+# Resúmenes de transcripciones largas: tokens por fragmento y llamadas simultáneas al modelo
+SUMMARY_PIECE_TOKENS = int(os.getenv("SUMMARY_PIECE_TOKENS", "6000"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+
+# Preguntas sobre transcripciones largas: solo los fragmentos más relevantes van al modelo
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+RETRIEVAL_PASSAGE_WORDS = int(os.getenv("RETRIEVAL_PASSAGE_WORDS", "120"))
+
+# Caché de respuestas del LLM (carpeta, tamaño máximo en MB y validez en horas)
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join("cache", "llm"))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "64"))
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+
+# Logs detallados por chunk y por petición (se pueden cambiar en caliente con POST /debug/verbose)
+LOG_VERBOSE = os.getenv("LOG_VERBOSE", "0") == "1"
+logging.basicConfig(format="%(message)s")
+log = logging.getLogger("transcriber")
+log.setLevel(logging.DEBUG if LOG_VERBOSE else logging.INFO)
 
 app = FastAPI()
 
@@ -49,16 +159,199 @@ print(f"[STARTUP] Script directory: {app_dir}")
 print(f"[STARTUP] PATH: {os.environ['PATH'][:200]}...")  # Print first 200 chars
 
 
-# Global in-memory storage for job status
-jobs = {}
+# Persistent storage for job status and per-chunk results
+job_store = JobStore(JOBS_DB)
+
+# Segments of every transcript, searchable while jobs run and after they are pruned
+transcript_index = TranscriptIndex(TRANSCRIPTS_DB)
+
+def upload_title(job_id: str, file_path: str):
+    """
+    Original file name of an upload (stored as {job_id}_{name}).
+    """
+    name = os.path.basename(file_path)
+    return name[len(job_id) + 1:] if name.startswith(job_id + "_") else name
+
+# Processing speed learned from finished jobs, per (mode, model, workers)
+throughput = ThroughputModel(JOBS_DB)
+
+def speed_key(mode: str, precision: Optional[str] = None):
+    """
+    (model, workers) that, with the mode, determine how fast a job is processed.
+    """
+    if mode == "local":
+        return variant_name(WHISPER_MODEL, precision or WHISPER_PRECISION), LOCAL_WORKERS
+    return CLOUD_MODEL, CLOUD_MAX_IN_FLIGHT
+
+def processing_estimate(job: dict):
+    return throughput.estimate(job['mode'], *speed_key(job['mode'], job.get('precision')), job.get('duration')) or 0
+
+def queue_wait(job_id: str, mode: str):
+    """
+    Predicted seconds until a queued job starts: what is left of the running
+    jobs plus the estimates of the jobs ahead of it, spread over the workers.
+    """
+    now = time.time()
+    running = []
+    for active_id in scheduler.active_jobs(mode):
+        job = job_store.get(active_id)
+        if job is None:
+            continue
+        if job.get('estimated_time'):
+            running.append(max(job['start_time'] + job['estimated_time'] - now, 0))
+        else:
+            running.append(processing_estimate(job))
+    ahead = []
+    for queued_id in scheduler.queued_jobs(mode):
+        if queued_id == job_id:
+            break
+        job = job_store.get(queued_id)
+        if job:
+            ahead.append(processing_estimate(job))
+    return predict_queue_wait(running, ahead, scheduler.stats()[mode]['workers'])
+
+# Push-based progress: status changes and finished chunks go to /events subscribers
+progress_broker = ProgressBroker()
+STATUS_FIELDS = ('status', 'stage', 'current_chunk', 'total_chunks', 'estimated_time', 'error')
+FINAL_STATES = ('completed', 'failed', 'interrupted')
+
+def compact_status(job_id: str, job: dict):
+    elapsed = time.time() - job['start_time']
+    estimated = job.get('estimated_time', 0)
+    eta = max(estimated - elapsed, 0) if estimated else None
+    wait = None
+    if job['status'] == 'queued':
+        # Not started yet: time to get a worker plus the predicted processing time
+        wait = queue_wait(job_id, job['mode'])
+        eta = wait + processing_estimate(job)
+    return {
+        "job_id": job_id,
+        "status": job['status'],
+        "stage": job['stage'],
+        "elapsed_seconds": elapsed,
+        "estimated_time": estimated,
+        "eta_seconds": eta,
+        "queue_wait_seconds": wait,
+        "current_chunk": job.get('current_chunk', 0),
+        "total_chunks": job.get('total_chunks', 0),
+        "queue_position": scheduler.position(job_id) if job['status'] == 'queued' else None,
+        "error": job['error']
+    }
+
+def publish_job_update(job_id: str, changed: dict, job: dict):
+    if 'status' in changed and job['status'] in FINAL_STATES:
+        JOBS_FINISHED.inc(status=job['status'])
+    if any(field in changed for field in STATUS_FIELDS) and progress_broker.has_subscribers(job_id):
+        progress_broker.publish(job_id, "status", compact_status(job_id, job))
+
+job_store.add_listener(publish_job_update)
+
+def publish_queue_positions(mode: str):
+    # Everyone behind a dispatched job moved up one place
+    for queued_id in scheduler.queued_jobs(mode):
+        if progress_broker.has_subscribers(queued_id):
+            job = job_store.get(queued_id)
+            if job:
+                progress_broker.publish(queued_id, "status", compact_status(queued_id, job))
+
+# Bounded transcription workers per mode with a priority/fair queue in front
+scheduler = JobScheduler(
+    {"local": SCHEDULER_LOCAL_WORKERS, "cloud": SCHEDULER_CLOUD_WORKERS},
+    max_queued=SCHEDULER_MAX_QUEUED,
+    on_queue_change=publish_queue_positions
+)
+
+# Queue depth and running jobs per mode, read from the scheduler at scrape time
+REGISTRY.register(Gauge(
+    "transcriber_queue_depth", "Trabajos en cola por modo", ("mode",),
+    callback=lambda: {(mode, ): s["queued"] for mode, s in scheduler.stats().items()}
+))
+REGISTRY.register(Gauge(
+    "transcriber_active_jobs", "Trabajos en proceso por modo", ("mode",),
+    callback=lambda: {(mode, ): s["active"] for mode, s in scheduler.stats().items()}
+))
+
+transcription_service = TranscriptionService(client=client, max_pools=WHISPER_MAX_POOLS)
+transcript_cache = TranscriptCache(TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024)
+
+# Same transcript, prompt and model: answered from disk, or shared with an identical request in flight
+llm_cache = ResponseCache(LLM_CACHE_DIR, LLM_CACHE_MAX_MB * 1024 * 1024, LLM_CACHE_TTL_HOURS * 3600)
+
+# Transcripts longer than one piece are summarized by pieces and the partial summaries combined
+summarizer = MapReduceSummarizer(
+    client, "Eres un asistente útil que analiza transcripciones de videos.",
+    piece_tokens=SUMMARY_PIECE_TOKENS, max_concurrency=SUMMARY_CONCURRENCY, cache=llm_cache,
+    async_client=async_client
+)
+
+# Subtitles and documents generated on demand from the archived segments
+export_service = ExportService()
+
+# BM25 passage indexes of recently asked-about transcripts
+passage_cache = PassageIndexCache()
+
+# Study guides and questions from the analysis panel, on the same clients and cache
+ai_service = AIService(
+    client=client, async_client=async_client, cache=llm_cache,
+    piece_tokens=SUMMARY_PIECE_TOKENS, max_concurrency=SUMMARY_CONCURRENCY
+)
+
+@app.on_event("startup")
+def recover_jobs():
+    interrupted = job_store.mark_interrupted()
+    if interrupted:
+        print(f"[STARTUP] {len(interrupted)} trabajo(s) interrumpido(s), se pueden reanudar: {', '.join(interrupted)}")
+    pruned = job_store.prune(JOB_MAX_AGE_HOURS * 3600)
+    if pruned:
+        print(f"[STARTUP] {len(pruned)} trabajo(s) antiguo(s) eliminado(s).")
+
+@app.on_event("startup")
+def warm_up_models():
+    # Load the configured model in the background so the first job doesn't pay for it
+    if not WHISPER_PRELOAD:
+        return
+    model_name = variant_name(WHISPER_MODEL, WHISPER_PRECISION)
+    if LOCAL_WORKERS > 1:
+        threading.Thread(
+            target=transcription_service.get_parallel_transcriber(model_name, LOCAL_WORKERS).warm_up,
+            daemon=True
+        ).start()
+    else:
+        model_registry.preload(model_name)
+
+@app.on_event("startup")
+def start_scheduler():
+    scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_workers():
+    scheduler.shutdown()
+    transcription_service.shutdown()
+    client.close()
+    await async_client.close()
 
 class VideoPath(BaseModel):
     path: str
 
+class ExportRequest(BaseModel):
+    job_id: str
+    format: str = "md"
+    # Include the last analysis (study guide or answer) generated for the job
+    include_analysis: bool = False
+
+class AnalyzeRequest(BaseModel):
+    text: str
+    # Empty prompt: study guide
+    prompt: str = ""
+    model: str = "gpt-4o"
+    job_id: Optional[str] = None
+
 class SummaryRequest(BaseModel):
     text: str
     prompt: str
     model: str = "gpt-3.5-turbo"
+    # Optional: with the job's stored segments, pieces are cut between segments
+    job_id: Optional[str] = None
 
 @app.get("/")
 async def read_root():
@@ -77,205 +370,433 @@ def list_routes():
         })
     return {"routes": routes}
 
+def finish_job(job_id: str, file_path: str, result: dict, auto_delete: bool = False, timings: dict = None):
+    final_text = result["text"]
+    timings = timings if timings is not None else {}
+    
+    # Guardar resultado
+    text_path = f"{os.path.splitext(file_path)[0]}.txt"
+    with stage_timer("export", timings, mode="txt"):
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write(final_text)
+        
+    print(f"[{job_id}] ¡Transcripción completada! Guardada en: {text_path}")
+    
+    # Final segments replace the per-chunk ones indexed while the job ran; cloud
+    # transcripts have no segments, so their chunks (or the whole text) are used
+    segments = result.get("segments")
+    if not segments:
+        segments = [
+            {"start": c["start"], "end": c["end"] or c["start"], "text": c["text"]} for c in job_store.get_chunks(job_id)
+        ] or [{"start": 0.0, "end": job_store.get(job_id).get('duration') or 0.0, "text": final_text}]
+    transcript_index.replace(job_id, upload_title(job_id, file_path), segments)
+    
+    # Auto-delete video if requested
+    if auto_delete:
+        try:
+            os.remove(file_path)
+            print(f"[{job_id}] Video original eliminado (Auto-Delete).")
+        except Exception as e:
+            print(f"[{job_id}] Error eliminando video original: {e}")
+        
+    # Update job status
+    job_store.update(job_id, status='completed', stage='finished', result=final_text, output_file=text_path, timings=timings)
+
 def convert_and_transcribe(job_id: str, file_path: str, mode: str = "local", auto_delete: bool = False):
+    # Desglose de tiempos por etapa del trabajo (visible en /status)
+    timings = {}
+    timings_lock = threading.Lock()
     try:
-        jobs[job_id]['status'] = 'processing'
-        jobs[job_id]['stage'] = 'preparing'
+        job = job_store.update(job_id, status='processing', stage='preparing', timings=timings)
         
-        base_name = os.path.splitext(file_path)[0]
         chunks_dir = os.path.join(os.path.dirname(file_path), "chunks_" + job_id)
+        # Local: the model at the precision chosen for this job (int8 is its own model)
+        model_name, workers = speed_key(mode, job.get('precision'))
         
-        # Get video duration for estimation
+        # Subida aún en curso por /ingest: se extrae el audio a medida que llegan los bytes
+        # si el contenedor se puede leer desde el principio; si no, se espera a que termine
+        ingest = active_ingests.get(job_id)
+        if ingest is not None and not ingest.streamable:
+            job_store.update(job_id, stage='uploading')
+            ingest.wait()
+        following = ingest is not None and not ingest.done
+        transcript_index.register(job_id, upload_title(job_id, file_path))
+        processing_start = time.time()
+        
+        # Un archivo idéntico ya transcrito con el mismo modo y modelo termina al instante
+        # (si se sigue la subida, el hash solo se conoce al final)
+        content_hash = None
+        if not following:
+            with stage_timer("cache_lookup", timings, mode=mode):
+                content_hash = job_store.get(job_id).get('content_hash') or file_sha256(file_path)
+                cached = transcript_cache.get(TranscriptCache.make_key(content_hash, mode, model_name))
+            if cached is not None and cached.get('text', '').strip():
+                print(f"[{job_id}] Transcripción encontrada en caché, se omite el procesamiento.")
+                job_store.update(job_id, content_hash=content_hash)
+                finish_job(job_id, file_path, cached, auto_delete, timings)
+                return
+        
+        # Un único probe: duración para la estimación y códec de audio para la extracción
+        # (si se sigue la subida, el de sus primeros bytes)
+        probe = None
         try:
-            probe = ffmpeg.probe(file_path)
+            if following:
+                probe = ingest.probe
+            else:
+                with stage_timer("probe", timings, mode=mode):
+                    probe = ffmpeg.probe(file_path)
             duration = float(probe['format']['duration'])
-            # Estimate: 20% of duration for base model (rough estimate)
-            estimated_seconds = duration * 0.2
-            jobs[job_id]['duration'] = duration
-            jobs[job_id]['estimated_time'] = estimated_seconds
-            print(f"[{job_id}] Duración: {duration}s. Estimado: {estimated_seconds}s")
+            # Estimate from the speed measured on previous jobs with this mode, model and workers
+            estimated_seconds = throughput.estimate(mode, model_name, workers, duration)
+            print(f"[{job_id}] Duración: {duration}s. Estimado: {estimated_seconds:.0f}s (RTF {throughput.rtf(mode, model_name, workers):.3f})")
         except Exception as e:
             print(f"[{job_id}] No se pudo obtener duración: {e}")
-            jobs[job_id]['duration'] = 0
-            jobs[job_id]['estimated_time'] = 0
+            duration = 0
+            estimated_seconds = 0
+        source_stream = audio_stream(probe) if probe else None
+        if probe and source_stream is None:
+            job_store.update(job_id, status='failed', error="El archivo no contiene ninguna pista de audio")
+            return
+        if source_stream:
+            log.debug("[%s] Audio de origen: %s, %s Hz", job_id, source_stream.get('codec_name'), source_stream.get('sample_rate'))
+        # estimated_time counts from start_time, which includes the time spent queued
+        job_store.update(job_id, duration=duration, estimated_time=time.time() - job['start_time'] + estimated_seconds)
+        if content_hash:
+            job_store.update(job_id, content_hash=content_hash)
 
-        if not os.path.exists(chunks_dir):
-            os.makedirs(chunks_dir)
+        # Reanudar: los chunks ya transcritos se conservan y la extracción empieza
+        # en el primero sin resultado (solo si el corte de chunks no ha cambiado)
+        chunk_plan = {"segment_time": SEGMENT_TIME, "chunking": CHUNKING_MODE, "chunk_overlap": CHUNK_OVERLAP}
+        if any(job.get(key, value) != value for key, value in chunk_plan.items()):
+            job_store.clear_chunks(job_id)
+        job_store.update(job_id, **chunk_plan)
+        first_index, start_offset, done_indices = job_store.resume_point(job_id)
+        if done_indices:
+            print(f"[{job_id}] Reanudando desde el chunk {first_index + 1} ({start_offset:.0f}s), {len(done_indices)} ya transcritos.")
 
         print(f"[{job_id}] --- Iniciando proceso ({mode}) para: {file_path} ---")
         
-        # 1. Extraer y dividir audio (Chunking)
-        jobs[job_id]['stage'] = 'converting_and_chunking'
-        chunk_pattern = os.path.join(chunks_dir, "chunk_%03d.mp3")
+        # 1. Extraer y dividir audio (Chunking), solapado con la transcripción:
+        # cada chunk pasa a transcribirse en cuanto ffmpeg termina de escribirlo
+        job_store.update(job_id, stage='converting_and_chunking')
+        log.debug(
+            "[%s] Dividiendo audio en chunks de %ss (%s, corte %s) en %s (ffmpeg: %s)...",
+            job_id, SEGMENT_TIME, EXTRACTION_MODE, CHUNKING_MODE, chunks_dir, transcription_service.ffmpeg_path
+        )
+        planner_options = {}
+        if CHUNKING_MODE == "silence":
+            planner_options = {"threshold_db": VAD_THRESHOLD_DB, "drop_silence": VAD_DROP_SILENCE}
+        chunks = transcription_service.stream_audio_chunks(
+            file_path, chunks_dir, SEGMENT_TIME, PIPELINE_MAX_PENDING, extraction_mode=EXTRACTION_MODE,
+            start_offset=start_offset, first_index=first_index, chunking=CHUNKING_MODE, overlap=CHUNK_OVERLAP,
+            input_feed=ingest.follow() if following else None, source_stream=source_stream,
+            max_chunk_bytes=CLOUD_MAX_CHUNK_BYTES if mode == "cloud" else None, **planner_options
+        )
+        pending_chunks = (chunk for chunk in chunks if chunk.index not in done_indices)
         
-        print(f"[{job_id}] Dividiendo audio en chunks de 10 min en {chunks_dir}...")
-        print(f"[{job_id}] DEBUG: About to enter try block")
-        print(f"[{job_id}] DEBUG: file_path = {file_path}")
-        print(f"[{job_id}] DEBUG: chunk_pattern = {chunk_pattern}")
+        # Update job with expected chunks for progress tracking (exact once ffmpeg finishes)
+        # Cloud mode may use shorter chunks than SEGMENT_TIME to fit the upload limit
+        expected_chunks = math.ceil(duration / chunks.segment_time) or None
+        remaining_chunks = max(expected_chunks - len(done_indices), 1) if expected_chunks else None
+        job_store.update(job_id, total_chunks=expected_chunks or 0)
 
+        # 2. Transcribir
+        def on_progress(current_step, total):
+            current_step += len(done_indices)
+            total += len(done_indices)
+            job_store.update(
+                job_id,
+                stage=f'transcribing_chunk_{current_step}_of_{total}',
+                current_chunk=current_step,
+                total_chunks=total
+            )
+            log.debug("[%s] Transcribiendo chunk %s/%s (%s)...", job_id, current_step, total, mode.upper())
+        
+        def on_chunk_done(chunk, text, segments):
+            # Persist each chunk as soon as it is done so a crash doesn't lose it
+            job_store.save_chunk(job_id, chunk.index, chunk.start, chunk.end, text, segments)
+            progress_broker.publish(job_id, "chunk", {"index": chunk.index, "start": chunk.start, "end": chunk.end, "text": text})
+            transcript_index.add_chunk(
+                job_id, chunk.index, segments or [{"start": chunk.start, "end": chunk.end or chunk.start, "text": text}]
+            )
+            if chunk.end is not None:
+                AUDIO_SECONDS.inc(chunk.end - chunk.start, mode=mode)
+            if chunk.transcribe_seconds is not None:
+                STAGE_SECONDS.observe(chunk.transcribe_seconds, stage="chunk_transcription", mode=mode)
+                with timings_lock:
+                    timings["chunk_transcription"] = round(timings.get("chunk_transcription", 0) + chunk.transcribe_seconds, 3)
+            if chunk.end is not None and duration:
+                # Live ETA: this job's own speed so far, blended with the learned one
+                with timings_lock:
+                    audio_position[0] = max(audio_position[0], chunk.end)
+                    audio_done = audio_position[0] - start_offset
+                remaining = throughput.remaining(
+                    mode, model_name, workers, duration - start_offset, audio_done, time.time() - transcription_start
+                )
+                job_store.update(job_id, estimated_time=time.time() - job['start_time'] + remaining)
+        
+        audio_position = [start_offset]
+        transcription_start = time.time()
         try:
-            print(f"[{job_id}] DEBUG: Inside try block")
-            print(f"[{job_id}] Running ffmpeg command...")
-            print(f"[{job_id}] Input file: {file_path}")
-            print(f"[{job_id}] Output pattern: {chunk_pattern}")
-            
-            # Set explicit ffmpeg executable path
-            ffmpeg_exe = os.path.join(os.getcwd(), "ffmpeg.exe")
-            print(f"[{job_id}] Using ffmpeg at: {ffmpeg_exe}")
-            print(f"[{job_id}] FFmpeg exists: {os.path.exists(ffmpeg_exe)}")
-            
-            print(f"[{job_id}] DEBUG: About to call ffmpeg.input()")
-            stream = ffmpeg.input(file_path)
-            print(f"[{job_id}] DEBUG: ffmpeg.input() successful")
-            
-            print(f"[{job_id}] DEBUG: About to call .output()")
-            stream = stream.output(chunk_pattern, f='segment', segment_time='600', acodec='libmp3lame', **{'q:a': 4, 'vn': None})
-            print(f"[{job_id}] DEBUG: .output() successful")
+            # Extraction and transcription overlap, so this is the wall time of both
+            with stage_timer("transcription", timings, mode=mode):
+                if mode == "local":
+                    log.debug("[%s] Usando modelo Whisper LOCAL (%s, %s proceso(s))...", job_id, model_name, LOCAL_WORKERS)
+                
+                    transcription_service.transcribe_local(
+                        pending_chunks, model_name, progress_callback=on_progress, workers=LOCAL_WORKERS,
+                        total=remaining_chunks, chunk_callback=on_chunk_done, max_pending=PIPELINE_MAX_PENDING
+                    )
             
-            print(f"[{job_id}] DEBUG: About to call .overwrite_output()")
-            stream = stream.overwrite_output()
-            print(f"[{job_id}] DEBUG: .overwrite_output() successful")
+                elif mode == "cloud":
+                    print(f"[{job_id}] Usando Whisper API (CLOUD, {CLOUD_MAX_IN_FLIGHT} peticiones simultáneas)...")
+                
+                    transcription_service.transcribe_cloud(
+                        pending_chunks,
+                        progress_callback=on_progress,
+                        max_in_flight=CLOUD_MAX_IN_FLIGHT,
+                        timeout=CLOUD_TIMEOUT,
+                        max_retries=CLOUD_MAX_RETRIES,
+                        model=CLOUD_MODEL,
+                        total=remaining_chunks,
+                        chunk_callback=on_chunk_done,
+                        max_pending=PIPELINE_MAX_PENDING
+                    )
             
-            print(f"[{job_id}] DEBUG: About to call .run()")
-            stream.run(cmd=ffmpeg_exe, capture_stdout=True, capture_stderr=True)
-            print(f"[{job_id}] FFmpeg command completed successfully")
+                else:
+                    raise ValueError(f"Modo de transcripción no válido: {mode}")
         except ffmpeg.Error as e:
             stderr_out = e.stderr.decode('utf8') if e.stderr else "No stderr output"
-            stdout_out = e.stdout.decode('utf8') if e.stdout else "No stdout output"
             error_msg = f"Error de FFmpeg: {stderr_out}"
             print(f"[{job_id}] FFmpeg Error Details:")
             print(f"[{job_id}]   STDERR: {stderr_out}")
-            print(f"[{job_id}]   STDOUT: {stdout_out}")
-            jobs[job_id]['status'] = 'failed'
-            jobs[job_id]['error'] = error_msg
-            return
-        except Exception as e:
-            error_msg = f"Error inesperado ejecutando FFmpeg: {str(e)}"
-            print(f"[{job_id}] {error_msg}")
-            import traceback
-            traceback.print_exc()
-            jobs[job_id]['status'] = 'failed'
-            jobs[job_id]['error'] = error_msg
+            job_store.update(job_id, status='failed', error=error_msg)
             return
+        if getattr(chunks, "extract_seconds", None) is not None:
+            STAGE_SECONDS.observe(chunks.extract_seconds, stage="extraction", mode=mode)
+            timings["extraction"] = round(chunks.extract_seconds, 3)
+        job_store.update(job_id, timings=dict(timings))
 
-        # Listar chunks generados
-        chunk_files = sorted([os.path.join(chunks_dir, f) for f in os.listdir(chunks_dir) if f.endswith('.mp3')])
-        total_chunks = len(chunk_files)
-        print(f"[{job_id}] Se generaron {total_chunks} chunks.")
-        
-        # Update job with total chunks for progress tracking
-        jobs[job_id]['total_chunks'] = total_chunks
-
-        # 2. Transcribir
-        full_transcript = []
-        
-        if mode == "local":
-            print(f"[{job_id}] Cargando modelo Whisper LOCAL...")
-            model = whisper.load_model("base") 
-            
-            for i, chunk_file in enumerate(chunk_files):
-                current_step = i + 1
-                jobs[job_id]['stage'] = f'transcribing_chunk_{current_step}_of_{total_chunks}'
-                jobs[job_id]['current_chunk'] = current_step
-                print(f"[{job_id}] Transcribiendo chunk {current_step}/{total_chunks} (LOCAL): {chunk_file}...")
-                
-                result = model.transcribe(chunk_file)
-                full_transcript.append(result["text"])
-        
-        elif mode == "cloud":
-            print(f"[{job_id}] Usando Whisper API (CLOUD)...")
-            
-            for i, chunk_file in enumerate(chunk_files):
-                current_step = i + 1
-                jobs[job_id]['stage'] = f'transcribing_chunk_{current_step}_of_{total_chunks}'
-                jobs[job_id]['current_chunk'] = current_step
-                print(f"[{job_id}] Transcribiendo chunk {current_step}/{total_chunks} (CLOUD): {chunk_file}...")
-                
-                with open(chunk_file, "rb") as audio_file:
-                    transcript = client.audio.transcriptions.create(
-                        model="whisper-1", 
-                        file=audio_file
-                    )
-                    full_transcript.append(transcript.text)
-
-        final_text = " ".join(full_transcript)
-        
-        # 3. Guardar resultado
-        text_path = f"{base_name}.txt"
-        with open(text_path, "w", encoding="utf-8") as f:
-            f.write(final_text)
-            
-        print(f"[{job_id}] ¡Transcripción completada! Guardada en: {text_path}")
+        # Texto completo a partir de los chunks guardados (incluye los de ejecuciones anteriores)
+        with stage_timer("join", timings, mode=mode):
+            result = job_store.assemble(job_id)
+        print(f"[{job_id}] Se generaron {job_store.get(job_id)['total_chunks']} chunks.")
+        if not result['text'].strip():
+            # Nothing heard (no speech detected or a silent file): fail rather than
+            # complete, and cache nothing, so a retry with other settings can work
+            shutil.rmtree(chunks_dir, ignore_errors=True)
+            job_store.update(job_id, status='failed', error="No se detectó voz en el audio: la transcripción está vacía", timings=timings)
+            return
+        content_hash = content_hash or job_store.get(job_id).get('content_hash')
+        if content_hash:
+            transcript_cache.put(TranscriptCache.make_key(content_hash, mode, model_name), result)
         
-        # 4. Limpieza
-        try:
-            # Wait a bit to ensure all file handles are released
-            time.sleep(1)
-            
-            # Retry logic for folder deletion
-            max_retries = 3
-            for attempt in range(max_retries):
+        # 3. Limpieza (en modo pcm no se crea carpeta de chunks)
+        with stage_timer("cleanup", timings, mode=mode):
+            if os.path.exists(chunks_dir):
                 try:
-                    shutil.rmtree(chunks_dir)
-                    print(f"[{job_id}] Carpeta de chunks eliminada.")
-                    break
-                except PermissionError as e:
-                    if attempt < max_retries - 1:
-                        print(f"[{job_id}] Intento {attempt + 1} falló, reintentando en 2 segundos...")
-                        time.sleep(2)
-                    else:
-                        print(f"[{job_id}] No se pudo eliminar carpeta de chunks después de {max_retries} intentos: {e}")
-        except Exception as e:
-            print(f"[{job_id}] Error eliminando chunks: {e}")
+                    # Wait a bit to ensure all file handles are released
+                    time.sleep(1)
             
-        # Auto-delete video if requested
-        if auto_delete:
-            try:
-                os.remove(file_path)
-                print(f"[{job_id}] Video original eliminado (Auto-Delete).")
-            except Exception as e:
-                print(f"[{job_id}] Error eliminando video original: {e}")
+                    # Retry logic for folder deletion
+                    max_retries = 3
+                    for attempt in range(max_retries):
+                        try:
+                            shutil.rmtree(chunks_dir)
+                            print(f"[{job_id}] Carpeta de chunks eliminada.")
+                            break
+                        except PermissionError as e:
+                            if attempt < max_retries - 1:
+                                print(f"[{job_id}] Intento {attempt + 1} falló, reintentando en 2 segundos...")
+                                time.sleep(2)
+                            else:
+                                print(f"[{job_id}] No se pudo eliminar carpeta de chunks después de {max_retries} intentos: {e}")
+                except Exception as e:
+                    print(f"[{job_id}] Error eliminando chunks: {e}")
             
-        # Update job status
-        jobs[job_id]['status'] = 'completed'
-        jobs[job_id]['stage'] = 'finished'
-        jobs[job_id]['result'] = final_text
-        jobs[job_id]['output_file'] = text_path
+        finish_job(job_id, file_path, result, auto_delete, timings)
+        # Only complete runs at full speed teach the model: resumed jobs did part of the
+        # work earlier and jobs fed by a running upload were paced by the upload
+        if not done_indices and ingest is None:
+            throughput.record(mode, model_name, workers, duration, time.time() - processing_start)
 
     except Exception as e:
         print(f"[{job_id}] Error crítico: {e}")
-        jobs[job_id]['status'] = 'failed'
-        jobs[job_id]['error'] = str(e)
+        job_store.update(job_id, status='failed', error=str(e))
+
+# Derived from the clock on every call; left out of the ETag so it only changes with the job
+VOLATILE_STATUS_FIELDS = ('elapsed_seconds', 'eta_seconds', 'queue_wait_seconds')
 
 @app.get("/status/{job_id}")
-def get_status(job_id: str):
-    if job_id not in jobs:
+def get_status(job_id: str, request: Request):
+    """
+    Compact job state (the transcript itself is served by /result). Carries a
+    weak ETag: polling with If-None-Match gets an empty 304 until the job changes.
+    """
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
-    elapsed = time.time() - job['start_time']
+    status = compact_status(job_id, job)
+    status["timings"] = job.get('timings', {})
+    stable = {k: v for k, v in status.items() if k not in VOLATILE_STATUS_FIELDS}
+    etag = 'W/"' + hashlib.sha1(json.dumps(stable, sort_keys=True).encode("utf-8")).hexdigest() + '"'
+    # no-cache: browsers revalidate every poll, sending If-None-Match on their own
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(status, headers=headers)
+
+@app.get("/result/{job_id}")
+def get_result(job_id: str, since: Optional[int] = None, limit: int = 0):
+    """
+    Without since: the finished transcript as plain text (supports Range requests).
+    With since (a cursor, 0 for the start): the chunks saved after it, with their
+    segments, plus the cursor for the next call; works while the job is running.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    return {
-        "job_id": job_id,
-        "status": job['status'],
-        "stage": job['stage'],
-        "elapsed_seconds": elapsed,
-        "estimated_time": job.get('estimated_time', 0),
-        "current_chunk": job.get('current_chunk', 0),
-        "total_chunks": job.get('total_chunks', 0),
-        "result": job['result'],
-        "error": job['error']
-    }
+    if since is not None:
+        chunks, cursor = job_store.chunks_since(job_id, max(since, 0), limit)
+        return {"job_id": job_id, "status": job['status'], "cursor": cursor, "chunks": chunks}
+    
+    if job['status'] != 'completed':
+        raise HTTPException(status_code=409, detail="La transcripción aún no ha terminado")
+    output_file = job.get('output_file')
+    if output_file and os.path.exists(output_file):
+        return FileResponse(output_file, media_type="text/plain; charset=utf-8")
+    return PlainTextResponse(job['result'] or "")
+
+def export_response(job_id: str, fmt: str, include_analysis: bool = False):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job['status'] != 'completed':
+        raise HTTPException(status_code=409, detail="La transcripción aún no ha terminado")
+    if fmt not in ExportService.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no válido: {fmt} (disponibles: {', '.join(ExportService.FORMATS)})")
+    
+    title = upload_title(job_id, job['file'])
+    if not transcript_index.has(job_id):
+        # Finished before segments were archived: archive them once now
+        transcript_index.replace(job_id, title, job_store.assemble(job_id)["segments"] or [
+            {"start": 0.0, "end": job.get('duration') or 0.0, "text": job['result'] or ""}
+        ])
+    
+    media_type, extension = ExportService.FORMATS[fmt]
+    metadata = {"title": title, "date": time.strftime("%Y-%m-%d", time.localtime(job['start_time']))}
+    parts = export_service.stream(
+        fmt, transcript_index.iter_segments(job_id), job.get('analysis') if include_analysis else None, metadata
+    )
+    filename = f"{os.path.splitext(title)[0]}.{extension}"
+    return StreamingResponse(
+        (part.encode("utf-8") for part in parts),
+        media_type=f"{media_type}; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+    )
+
+@app.post("/export")
+def export_transcript(req: ExportRequest):
+    """
+    Streams the transcript as SRT, WebVTT, JSON lines or NotebookLM Markdown (format: srt, vtt, jsonl, md).
+    """
+    return export_response(req.job_id, req.format, req.include_analysis)
+
+@app.get("/export/{job_id}")
+def download_export(job_id: str, format: str = "srt", include_analysis: bool = False):
+    return export_response(job_id, format, include_analysis)
+
+@app.get("/search")
+def search_transcripts(q: str, job_id: Optional[str] = None, limit: int = 20, offset: int = 0):
+    """
+    Full-text search over the segments of all transcripts (or one, with job_id).
+    Hits are ranked by BM25 and carry their position in milliseconds.
+    """
+    limit = max(1, min(limit, 100))
+    hits = transcript_index.search(q, limit=limit, offset=max(offset, 0), job_id=job_id)
+    return {"query": q, "hits": hits}
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus scrape endpoint: stage latencies, bytes and audio seconds processed, queue state.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/throughput")
+def get_throughput():
+    """
+    Learned processing speed per mode, model and worker count (for ETAs and capacity planning).
+    """
+    return {"default_rtf": DEFAULT_RTF, "configurations": throughput.snapshot()}
+
+@app.post("/debug/verbose")
+def set_verbose(enabled: bool = Form(...)):
+    """
+    Turns per-chunk debug logging on or off without restarting the server.
+    """
+    log.setLevel(logging.DEBUG if enabled else logging.INFO)
+    return {"verbose": enabled}
+
+@app.get("/events/{job_id}")
+async def job_events(job_id: str, request: Request):
+    """
+    Server-Sent Events stream: a "status" event whenever stage, chunk or ETA
+    change, and a "chunk" event with the partial text as each chunk finishes.
+    """
+    # Subscribe before reading the job: a change made in between is then queued
+    # (and at worst sent twice) instead of lost, final status included
+    queue = progress_broker.subscribe(job_id)
+    job = job_store.get(job_id)
+    if job is None:
+        progress_broker.unsubscribe(job_id, queue)
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        try:
+            # Current state and chunks already done, for clients joining (or reconnecting) mid-job
+            yield format_sse("status", compact_status(job_id, job))
+            for chunk in job_store.get_chunks(job_id):
+                yield format_sse("chunk", {"index": chunk["index"], "start": chunk["start"], "end": chunk["end"], "text": chunk["text"]})
+            if job['status'] in FINAL_STATES:
+                return
+            
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event, data)
+                if event == "status" and data["status"] in FINAL_STATES:
+                    break
+        finally:
+            progress_broker.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/upload")
 def upload_video(
     file: UploadFile = File(...),
     transcription_mode: str = Form("local"),
-    summary_model: str = Form("gpt-3.5-turbo")
+    summary_model: str = Form("gpt-3.5-turbo"),
+    precision: str = Form(WHISPER_PRECISION)
 ):
     # Validate extension
-    if not file.filename.lower().endswith('.mp4'):
-        raise HTTPException(status_code=400, detail="El archivo debe ser MP4")
+    if not is_supported(file.filename):
+        raise HTTPException(status_code=400, detail="Formato no soportado: sube un archivo de audio o vídeo")
+    if transcription_mode not in ("local", "cloud"):
+        raise HTTPException(status_code=400, detail=f"Modo de transcripción no válido: {transcription_mode}")
+    if precision not in PRECISIONS:
+        raise HTTPException(status_code=400, detail=f"Precisión no válida: {precision}")
 
     # Create uploads directory
     uploads_dir = "uploads"
@@ -288,89 +809,311 @@ def upload_video(
     # Define file path
     file_path = os.path.join(uploads_dir, f"{job_id}_{file.filename}")
     
-    # Save file (Stream)
+    # Save file (Stream), hashing it on the way for the transcript cache
+    content_hash = hashlib.sha256()
     try:
         with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+            for block in iter(lambda: file.file.read(HASH_BLOCK_SIZE), b""):
+                content_hash.update(block)
+                buffer.write(block)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error guardando archivo: {e}")
     finally:
         file.file.close()
+    BYTES_PROCESSED.inc(os.path.getsize(file_path), kind="upload")
 
     # Initialize Job Status
-    jobs[job_id] = {
-        'id': job_id,
-        'status': 'uploaded',
-        'stage': 'ready_to_process',
-        'start_time': time.time(),
-        'file': file_path,
-        'error': None,
-        'result': None,
-        'mode': transcription_mode
-    }
+    job_store.create(
+        job_id,
+        status='uploaded',
+        stage='ready_to_process',
+        start_time=time.time(),
+        file=file_path,
+        error=None,
+        result=None,
+        mode=transcription_mode,
+        precision=precision,
+        content_hash=content_hash.hexdigest()
+    )
+    job_store.prune(JOB_MAX_AGE_HOURS * 3600)
     
     return {
         "message": "Subida completada. Esperando confirmación para iniciar.", 
         "job_id": job_id
     }
 
-@app.post("/start_process/{job_id}")
-def start_process(job_id: str, background_tasks: BackgroundTasks, auto_delete: bool = Form(False)):
-    if job_id not in jobs:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    job = jobs[job_id]
+# Uploads still arriving through /ingest, by job id (extraction can follow them)
+active_ingests = {}
+
+@app.post("/ingest")
+async def ingest_video(
+    request: Request,
+    filename: str,
+    transcription_mode: str = "local",
+    precision: str = WHISPER_PRECISION,
+    auto_start: bool = False,
+    auto_delete: bool = False,
+    priority: str = "normal"
+):
+    """
+    Streaming alternative to /upload: the request body is the raw file. It is
+    written in large blocks and hashed as it arrives, its duration is probed
+    from the first bytes and, with auto_start, transcription starts before
+    the upload ends (if the container can be read from its head).
+    """
+    if not is_supported(filename):
+        raise HTTPException(status_code=400, detail="Formato no soportado: sube un archivo de audio o vídeo")
+    if transcription_mode not in ("local", "cloud"):
+        raise HTTPException(status_code=400, detail=f"Modo de transcripción no válido: {transcription_mode}")
+    if precision not in PRECISIONS:
+        raise HTTPException(status_code=400, detail=f"Precisión no válida: {precision}")
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Prioridad no válida: {priority}")
+
+    uploads_dir = "uploads"
+    if not os.path.exists(uploads_dir):
+        os.makedirs(uploads_dir)
+
+    job_id = str(uuid.uuid4())
+    file_path = os.path.join(uploads_dir, f"{job_id}_{os.path.basename(filename)}")
+    ingest = StreamingIngest(file_path)
+    job_store.create(
+        job_id,
+        status='uploading',
+        stage='uploading',
+        start_time=time.time(),
+        file=file_path,
+        error=None,
+        result=None,
+        mode=transcription_mode,
+        precision=precision
+    )
+    active_ingests[job_id] = ingest
+    queue_position = None
+    started = False
+
+    def start():
+        try:
+            return enqueue_job(job_id, request, auto_delete, priority)
+        except HTTPException as e:
+            # Queue full: the upload itself still completes and can be started later
+            print(f"[{job_id}] No se pudo iniciar automáticamente: {e.detail}")
+            return None
+
+    try:
+        async for data in request.stream():
+            await ingest.write(data)
+            if auto_start and not started and ingest.streamable:
+                started = True
+                job_store.update(job_id, duration=ingest.duration)
+                queue_position = start()
+        await ingest.finish()
+    except Exception as e:
+        ingest.abort(e)
+        job_store.update(job_id, status='failed', stage='failed', error=f"Error recibiendo archivo: {e}")
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=f"Error guardando archivo: {e}")
+    finally:
+        active_ingests.pop(job_id, None)
+        BYTES_PROCESSED.inc(ingest.bytes_written, kind="upload")
+
+    # The hash is only known now; a job already running picks it up for the cache
+    job_store.update(job_id, content_hash=ingest.content_hash)
+    job_store.transition(job_id, ('uploading',), status='uploaded', stage='ready_to_process')
+    job_store.prune(JOB_MAX_AGE_HOURS * 3600)
+    if auto_start and not started:
+        queue_position = start()
+
+    return {
+        "message": "Procesamiento iniciado" if queue_position else "Subida completada. Esperando confirmación para iniciar.",
+        "job_id": job_id,
+        "queue_position": queue_position
+    }
+
+def enqueue_job(job_id: str, request: Request, auto_delete: bool = False, priority: str = "normal"):
+    """
+    Queues a job on the scheduler. Returns its queue position; raises 429 if the queue is full.
+    """
+    job = job_store.get(job_id)
+    previous_status, previous_stage = job['status'], job['stage']
     
-    # Update status
-    job['status'] = 'queued'
-    job['stage'] = 'starting'
-    job['start_time'] = time.time() # Reset start time for accurate timing
+    # Update status (interrupted/failed jobs resume from their first chunk without a result)
+    job = job_store.update(
+        job_id,
+        status='queued',
+        stage='starting',
+        start_time=time.time(), # Reset start time for accurate timing
+        error=None,
+        auto_delete=auto_delete
+    )
     
-    print(f"[{job_id}] START_PROCESS called")
-    print(f"[{job_id}] File: {job['file']}")
-    print(f"[{job_id}] Mode: {job['mode']}")
-    print(f"[{job_id}] Auto-delete: {auto_delete}")
+    log.debug("[%s] START_PROCESS called (file: %s, mode: %s, auto-delete: %s)", job_id, job['file'], job['mode'], auto_delete)
     
     # Start Processing with error wrapper
     def safe_convert_and_transcribe():
         try:
-            print(f"[{job_id}] Background task starting...")
+            log.debug("[%s] Background task starting...", job_id)
             convert_and_transcribe(job_id, job['file'], job['mode'], auto_delete)
-            print(f"[{job_id}] Background task completed")
+            log.debug("[%s] Background task completed", job_id)
         except Exception as e:
             print(f"[{job_id}] CRITICAL ERROR in background task: {e}")
             import traceback
             traceback.print_exc()
-            jobs[job_id]['status'] = 'failed'
-            jobs[job_id]['error'] = f"Error crítico: {str(e)}"
+            job_store.update(job_id, status='failed', error=f"Error crítico: {str(e)}")
     
-    background_tasks.add_task(safe_convert_and_transcribe)
+    # Fairness is per user: explicit X-User-Id header, otherwise the client address
+    user = request.headers.get("X-User-Id") or (request.client.host if request.client else None)
+    try:
+        return scheduler.submit(job_id, job['mode'], safe_convert_and_transcribe, user=user, priority=priority)
+    except QueueFullError as e:
+        job_store.update(job_id, status=previous_status, stage=previous_stage)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+
+@app.post("/start_process/{job_id}")
+def start_process(
+    job_id: str,
+    request: Request,
+    auto_delete: bool = Form(False),
+    priority: str = Form("normal")
+):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job['status'] in JobStore.ACTIVE_STATES:
+        raise HTTPException(status_code=409, detail="El trabajo ya está en proceso")
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Prioridad no válida: {priority}")
     
-    return {"message": "Procesamiento iniciado"}
+    # A job still uploading starts right away: extraction follows the growing file
+    position = enqueue_job(job_id, request, auto_delete, priority)
+    return {"message": "Procesamiento iniciado", "queue_position": position}
+
+def summary_prompt(text: str, prompt: str):
+    return f"Contexto: El siguiente es un texto transcrito de un video.\n\nTexto:\n{text}\n\nInstrucción del usuario: {prompt}\n\nPor favor, responde a la instrucción basándote en el texto."
+
+def transcript_segments(job_id: Optional[str], text: str):
+    """
+    Stored segments of a job, if the text sent is still its transcript (it can be edited in the UI).
+    """
+    if not job_id or not job_store.get(job_id):
+        return None
+    transcript = job_store.assemble(job_id)
+    return transcript["segments"] if transcript["text"].strip() == text.strip() else None
+
+def retrieve_context(job_id: Optional[str], text: str, segments, prompt: str):
+    """
+    For a question about a transcript too long to send whole, the passages
+    that best match it (BM25), in order and with their time; otherwise None.
+    Weak matches (most of the question's words not found) also give None, so
+    the answer comes from the whole transcript (map-reduce).
+    """
+    if not is_question(prompt):
+        return None
+    with stage_timer("retrieval", mode="qa"):
+        index = passage_cache.get(job_id, text, segments, RETRIEVAL_PASSAGE_WORDS)
+        if len(index.passages) <= RETRIEVAL_TOP_K:
+            return None
+        results = index.search(prompt, RETRIEVAL_TOP_K)
+    if not results or term_coverage(prompt, results) < MIN_TERM_COVERAGE:
+        return None
+    return "(Fragmentos de la transcripción más relevantes para la pregunta, en orden)\n\n" + format_passages(results)
 
 @app.post("/summary")
 async def generate_summary(req: SummaryRequest):
     try:
-        # Construct the prompt
-        full_prompt = f"Contexto: El siguiente es un texto transcrito de un video.\n\nTexto:\n{req.text[:15000]}...\n\nInstrucción del usuario: {req.prompt}\n\nPor favor, responde a la instrucción basándote en el texto."
-        
-        print(f"Enviando petición a OpenAI ({req.model})...")
-        response = client.chat.completions.create(
-            model=req.model,
-            messages=[
-                {"role": "system", "content": "Eres un asistente útil que analiza transcripciones de videos."},
-                {"role": "user", "content": full_prompt}
-            ]
-        )
+        segments = await asyncio.to_thread(transcript_segments, req.job_id, req.text)
+        context = await asyncio.to_thread(retrieve_context, req.job_id, req.text, segments, req.prompt)
         
-        summary = response.choices[0].message.content
+        log.debug("Enviando petición a OpenAI (%s)...", req.model)
+        # In a thread: the event loop keeps serving status polls and progress streams meanwhile
+        with stage_timer("llm_call", mode="summary"):
+            if context:
+                summary = await asyncio.to_thread(ai_service.generate_response, context, req.prompt, req.model)
+            else:
+                summary = await asyncio.to_thread(summarizer.run, req.text, req.prompt, req.model, summary_prompt, segments)
         return {"summary": summary}
         
     except Exception as e:
         print(f"Error OpenAI: {e}")
         return {"summary": f"Error generando resumen: {str(e)}"}
 
+@app.post("/summary/stream")
+async def stream_summary(req: SummaryRequest):
+    """
+    Same as /summary, streamed as Server-Sent Events: a "token" event with each
+    piece of text as the model writes it, then "done" (or "error").
+    """
+    segments = await asyncio.to_thread(transcript_segments, req.job_id, req.text)
+    context = await asyncio.to_thread(retrieve_context, req.job_id, req.text, segments, req.prompt)
+    if context:
+        parts = ai_service.stream_response(context, req.prompt, req.model)
+    else:
+        parts = summarizer.stream(req.text, req.prompt, req.model, summary_prompt, segments)
+    
+    async def event_stream():
+        try:
+            with stage_timer("llm_call", mode="summary_stream"):
+                async for part in parts:
+                    yield format_sse("token", {"text": part})
+            yield format_sse("done", {})
+        except Exception as e:
+            print(f"Error OpenAI: {e}")
+            yield format_sse("error", {"detail": f"Error generando resumen: {str(e)}"})
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/analyze")
+async def analyze(req: AnalyzeRequest):
+    segments = await asyncio.to_thread(transcript_segments, req.job_id, req.text)
+    context = await asyncio.to_thread(retrieve_context, req.job_id, req.text, segments, req.prompt)
+    with stage_timer("llm_call", mode="analyze"):
+        if context:
+            analysis = await asyncio.to_thread(ai_service.generate_response, context, req.prompt, req.model)
+        elif req.prompt:
+            analysis = await asyncio.to_thread(ai_service.generate_response, req.text, req.prompt, req.model, segments)
+        else:
+            analysis = await asyncio.to_thread(ai_service.generate_student_guide, req.text, req.model, segments)
+    if req.job_id and job_store.exists(req.job_id):
+        job_store.update(req.job_id, analysis=analysis)
+    return {"analysis": analysis}
+
+@app.post("/analyze/stream")
+async def stream_analysis(req: AnalyzeRequest):
+    """
+    Streaming /analyze: "token" events with the text as it is written, then
+    "done" (or "error", in which case the job keeps its previous analysis).
+    """
+    segments = await asyncio.to_thread(transcript_segments, req.job_id, req.text)
+    context = await asyncio.to_thread(retrieve_context, req.job_id, req.text, segments, req.prompt)
+    if context:
+        parts = ai_service.stream_response(context, req.prompt, req.model)
+    elif req.prompt:
+        parts = ai_service.stream_response(req.text, req.prompt, req.model, segments)
+    else:
+        parts = ai_service.stream_student_guide(req.text, req.model, segments)
+    
+    async def event_stream():
+        analysis = []
+        try:
+            with stage_timer("llm_call", mode="analyze_stream"):
+                async for part in parts:
+                    analysis.append(part)
+                    yield format_sse("token", {"text": part})
+        except Exception as e:
+            print(f"Error OpenAI: {e}")
+            yield format_sse("error", {"detail": f"Error en AI Service: {str(e)}"})
+            return
+        if req.job_id and job_store.exists(req.job_id):
+            job_store.update(req.job_id, analysis="".join(analysis))
+        yield format_sse("done", {})
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
+    # Required for the spawn-based transcription workers in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+
     def open_browser():
         time.sleep(1.5)
         webbrowser.open("http://127.0.0.1:8001")
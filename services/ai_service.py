@@ -1,39 +1,62 @@
 import os
-from openai import OpenAI
+
+from services.openai_clients import create_clients
+from services.summarizer import MapReduceSummarizer, PIECE_TOKENS, MAX_CONCURRENCY
+
+SYSTEM_MESSAGE = "Eres un tutor experto que ayuda a estudiantes a aprender de sus clases transcritas."
+
+STUDENT_GUIDE_PROMPT = (
+    "Analiza la siguiente transcripción y genera una guía de estudio estructurada en Markdown que incluya:\n"
+    "1. **Conceptos Clave**: Las 5-7 ideas más importantes.\n"
+    "2. **Glosario**: Definiciones de términos técnicos o difíciles mencionados.\n"
+    "3. **Resumen Ejecutivo**: Un resumen de 3 párrafos del contenido.\n"
+    "4. **Preguntas de Autoevaluación**: 5 preguntas para que el estudiante pruebe su conocimiento."
+)
 
 class AIService:
-    def __init__(self, api_key):
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY no encontrada.")
-        self.client = OpenAI(api_key=api_key)
+    def __init__(self, api_key=None, piece_tokens=PIECE_TOKENS, max_concurrency=MAX_CONCURRENCY, cache=None,
+                 client=None, async_client=None):
+        # The app passes its shared clients; an api_key alone builds a pair of its own
+        if client is None or async_client is None:
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY no encontrada.")
+            client, async_client = create_clients(api_key)
+        self.client = client
+        self.async_client = async_client
+        # cache: optional ResponseCache, so repeated clicks on the same guide don't call the API again
+        self.summarizer = MapReduceSummarizer(
+            self.client, SYSTEM_MESSAGE, piece_tokens=piece_tokens, max_concurrency=max_concurrency, cache=cache,
+            async_client=self.async_client
+        )
 
-    def generate_response(self, text, prompt, model="gpt-4o"):
+    def generate_response(self, text, prompt, model="gpt-4o", segments=None):
         """
-        Generic GPT response generator.
+        Generic GPT response generator. Long transcripts are summarized by
+        pieces (map-reduce) instead of being truncated.
         """
         try:
-            full_prompt = f"Contexto: El siguiente es un texto transcrito de un contenido educativo.\n\nTexto:\n{text[:15000]}\n\nInstrucción: {prompt}"
-            
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "Eres un tutor experto que ayuda a estudiantes a aprender de sus clases transcritas."},
-                    {"role": "user", "content": full_prompt}
-                ]
-            )
-            return response.choices[0].message.content
+            return self.summarizer.run(text, prompt, model, self._build_prompt, segments)
         except Exception as e:
             return f"Error en AI Service: {str(e)}"
 
-    def generate_student_guide(self, text, model="gpt-4o"):
+    async def stream_response(self, text, prompt, model="gpt-4o", segments=None):
+        """
+        Streaming variant of generate_response: yields the answer's text as it
+        arrives. Errors are raised, not yielded, so callers can tell them from
+        the answer (part of which may already have been sent).
+        """
+        async for part in self.summarizer.stream(text, prompt, model, self._build_prompt, segments):
+            yield part
+
+    @staticmethod
+    def _build_prompt(text, prompt):
+        return f"Contexto: El siguiente es un texto transcrito de un contenido educativo.\n\nTexto:\n{text}\n\nInstrucción: {prompt}"
+
+    def generate_student_guide(self, text, model="gpt-4o", segments=None):
         """
         Generates a structured study guide.
         """
-        prompt = (
-            "Analiza la siguiente transcripción y genera una guía de estudio estructurada en Markdown que incluya:\n"
-            "1. **Conceptos Clave**: Las 5-7 ideas más importantes.\n"
-            "2. **Glosario**: Definiciones de términos técnicos o difíciles mencionados.\n"
-            "3. **Resumen Ejecutivo**: Un resumen de 3 párrafos del contenido.\n"
-            "4. **Preguntas de Autoevaluación**: 5 preguntas para que el estudiante pruebe su conocimiento."
-        )
-        return self.generate_response(text, prompt, model)
+        return self.generate_response(text, STUDENT_GUIDE_PROMPT, model, segments)
+
+    def stream_student_guide(self, text, model="gpt-4o", segments=None):
+        return self.stream_response(text, STUDENT_GUIDE_PROMPT, model, segments)
@@ -0,0 +1,203 @@
+import numpy as np
+
+# Analysis frame for the energy pass (30 ms at 16 kHz)
+FRAME_SECONDS = 0.03
+
+# Adaptive threshold: noise floor (this percentile of frame energies so far)
+# plus a margin, at most halfway to the speech level (SPEECH_PERCENTILE) so a
+# recording with hardly any pauses stays speech, and never below
+# MIN_THRESHOLD_DB (pure digital silence)
+NOISE_PERCENTILE = 10
+SPEECH_PERCENTILE = 90
+NOISE_MARGIN_DB = 10.0
+MIN_THRESHOLD_DB = -60.0
+# Frame energies are counted in 1 dB bins from HISTOGRAM_MIN_DB to 0 dBFS
+HISTOGRAM_MIN_DB = -100
+
+
+def frame_energies(samples, frame_size):
+    """
+    RMS energy in dBFS of each complete frame of samples.
+    """
+    count = len(samples) // frame_size
+    if count == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[:count * frame_size].reshape(count, frame_size)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+class SilenceChunker:
+    """
+    Streaming chunk planner driven by an energy-based voice activity pass.
+
+    Samples are fed in as they are decoded. A chunk is cut in a pause once it
+    reaches target_seconds (at the quietest frame if no pause shows up before
+    max_seconds), and silent stretches longer than drop_silence seconds are
+    left out entirely. Emitted chunks carry their start sample so timestamps
+    stay exact however much silence was dropped.
+
+    A frame is speech when its energy exceeds threshold_db or, by default
+    (None), the recording's noise floor measured so far plus
+    noise_margin_db, so quiet recordings are not taken for silence.
+    """
+
+    def __init__(self, sample_rate=16000, target_seconds=600, max_seconds=None, threshold_db=None,
+                 min_pause=0.3, drop_silence=2.0, padding=0.2, noise_margin_db=NOISE_MARGIN_DB):
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * FRAME_SECONDS)
+        self.target_frames = self._frames(target_seconds)
+        self.max_frames = self._frames(max_seconds or target_seconds * 1.25)
+        self.threshold_db = threshold_db
+        self.noise_margin_db = noise_margin_db
+        self._histogram = np.zeros(-HISTOGRAM_MIN_DB, dtype=np.int64)
+        self.min_pause_frames = max(1, self._frames(min_pause))
+        self.drop_frames = max(self.min_pause_frames, self._frames(drop_silence))
+        self.padding_frames = self._frames(padding)
+
+        # Samples not yet emitted or dropped live in _data[_head:_tail] and start
+        # at absolute sample _base; the array grows by doubling so feeding is O(n)
+        self._data = np.empty(sample_rate * 30, dtype=np.float32)
+        self._head = 0
+        self._tail = 0
+        self._base = 0
+        self._energies = []
+        # Frame (relative to _base) where the open chunk starts; None while in silence
+        self._chunk_start = None
+        self._silence_run = 0
+
+    def _frames(self, seconds):
+        return int(round(seconds / FRAME_SECONDS))
+
+    def feed(self, samples):
+        """
+        Adds decoded samples; returns the (start_sample, audio) chunks completed by them.
+        """
+        self._append(samples)
+        analysed = len(self._energies) * self.frame_size
+        new_energies = frame_energies(self._buffer()[analysed:], self.frame_size)
+        threshold = self._threshold(new_energies)
+
+        chunks = []
+        for energy in new_energies:
+            self._energies.append(float(energy))
+            chunk = self._step(len(self._energies) - 1, energy > threshold)
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self):
+        """
+        End of stream: returns the last open chunk, if it has any speech.
+        """
+        chunks = []
+        if self._chunk_start is not None:
+            end = self._tail - self._head
+            if self._silence_run:
+                end = min(end, (len(self._energies) - self._silence_run + self.padding_frames) * self.frame_size)
+            chunks.append(self._emit(self._chunk_start, end // self.frame_size, end_sample=end))
+        self._base += self._tail - self._head
+        self._head = self._tail = 0
+        self._energies = []
+        self._chunk_start = None
+        return chunks
+
+    def _threshold(self, new_energies):
+        """
+        Speech threshold for the frames being fed, updating the noise floor with them.
+        """
+        if self.threshold_db is not None:
+            return self.threshold_db
+        bins = np.clip(new_energies - HISTOGRAM_MIN_DB, 0, len(self._histogram) - 1).astype(np.int64)
+        self._histogram += np.bincount(bins, minlength=len(self._histogram))
+        counts = np.cumsum(self._histogram)
+        if counts[-1] == 0:
+            return MIN_THRESHOLD_DB
+        floor, speech = HISTOGRAM_MIN_DB + np.searchsorted(
+            counts, [counts[-1] * NOISE_PERCENTILE / 100, counts[-1] * SPEECH_PERCENTILE / 100]
+        )
+        return max(floor + min(self.noise_margin_db, (speech - floor) / 2), MIN_THRESHOLD_DB)
+
+    def _buffer(self):
+        return self._data[self._head:self._tail]
+
+    def _append(self, samples):
+        pending = self._tail - self._head
+        if self._tail + len(samples) > len(self._data):
+            # Compact to the front, growing only when the live part really needs it
+            capacity = len(self._data)
+            while pending + len(samples) > capacity:
+                capacity *= 2
+            data = np.empty(capacity, dtype=np.float32) if capacity != len(self._data) else self._data
+            data[:pending] = self._data[self._head:self._tail]
+            self._data, self._head, self._tail = data, 0, pending
+        self._data[self._tail:self._tail + len(samples)] = samples
+        self._tail += len(samples)
+
+    def _step(self, frame, voiced):
+        if self._chunk_start is None:
+            if not voiced:
+                self._discard_silence(frame)
+                return None
+            # Speech starts: open a chunk with a little lead-in
+            self._chunk_start = max(0, frame - self.padding_frames)
+            self._silence_run = 0
+            return None
+
+        self._silence_run = 0 if voiced else self._silence_run + 1
+        length = frame + 1 - self._chunk_start
+
+        if self._silence_run >= self.drop_frames:
+            # Long pause: close the chunk shortly after speech ended, skip the rest
+            speech_end = frame + 1 - self._silence_run
+            chunk = self._emit(self._chunk_start, speech_end + self.padding_frames)
+            self._chunk_start = None
+            return chunk
+        if length >= self.target_frames and self._silence_run >= self.min_pause_frames:
+            # Cut in the middle of the pause; the next chunk opens when speech resumes
+            cut = frame + 1 - self._silence_run // 2
+            chunk = self._emit(self._chunk_start, cut)
+            self._chunk_start = None
+            return chunk
+        if length >= self.max_frames:
+            # No pause found: cut at the quietest frame of the search window
+            window_start = self._chunk_start + self.target_frames // 2
+            window = self._energies[window_start:frame + 1]
+            cut = window_start + int(np.argmin(window)) + 1
+            chunk = self._emit(self._chunk_start, cut)
+            self._chunk_start = 0
+            self._silence_run = 0
+            return chunk
+        return None
+
+    def _emit(self, start_frame, end_frame, end_sample=None):
+        """
+        Returns the chunk [start_frame, end_frame) and drops everything before end_frame.
+        """
+        end_frame = min(end_frame, len(self._energies))
+        start = start_frame * self.frame_size
+        end = end_sample if end_sample is not None else end_frame * self.frame_size
+        chunk = (self._base + start, self._buffer()[start:end].copy())
+        self._drop(end_frame)
+        return chunk
+
+    def _discard_silence(self, frame):
+        # Keep only the frames that could become the lead-in of the next chunk
+        keep_from = frame + 1 - self.padding_frames
+        if keep_from > 0:
+            self._drop(keep_from)
+
+    def _drop(self, frames):
+        self._head += frames * self.frame_size
+        self._base += frames * self.frame_size
+        self._energies = self._energies[frames:]
+        self._silence_run = min(self._silence_run, len(self._energies))
+
+
+def plan_chunks(samples, sample_rate=16000, **options):
+    """
+    Splits a whole in-memory signal; returns [(start_seconds, end_seconds, audio)].
+    """
+    chunker = SilenceChunker(sample_rate, **options)
+    planned = chunker.feed(samples) + chunker.flush()
+    return [(start / sample_rate, (start + len(audio)) / sample_rate, audio) for start, audio in planned]
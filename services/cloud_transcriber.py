@@ -0,0 +1,134 @@
+import io
+import os
+import random
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import openai
+
+from services.pipeline import ChunkProgress, SubmitWindow, chunk_done, SAMPLE_RATE
+from services.transcript_merge import merge_chunks
+from services.metrics import BYTES_PROCESSED
+
+
+class CloudTranscriber:
+    """
+    Sends chunks to the Whisper API concurrently with a bounded number of
+    requests in flight. Rate limits (429), server errors (5xx), timeouts and
+    connection errors are retried with exponential backoff and jitter.
+    """
+
+    RETRYABLE_ERRORS = (
+        openai.RateLimitError,
+        openai.InternalServerError,
+        openai.APITimeoutError,
+        openai.APIConnectionError
+    )
+
+    def __init__(self, client, model="whisper-1", max_in_flight=4, timeout=120,
+                 max_retries=5, backoff_base=1.0, backoff_max=30.0):
+        # Retries are handled here, so the client's own retry loop is disabled
+        self.client = client.with_options(timeout=timeout, max_retries=0)
+        self.model = model
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def transcribe(self, chunks, progress_callback=None, total=None, chunk_callback=None, max_pending=4):
+        """
+        Transcribes AudioChunk objects and joins the texts in chunk order.
+        chunks may be a lazy stream; each chunk is sent as soon as it arrives
+        and a request slot is free, with at most max_pending more waiting.
+        chunk_callback(chunk, text, segments) runs as each chunk finishes.
+        """
+        progress = ChunkProgress(progress_callback, total)
+        window = SubmitWindow(self.max_in_flight + max_pending)
+        futures = []
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            try:
+                for chunk in window.feed(chunks):
+                    if progress.error:
+                        break
+                    future = executor.submit(self._transcribe_chunk, chunk)
+                    futures.append((chunk.index, chunk.start, chunk.end, future))
+                    progress.submitted_one()
+                    if chunk_callback:
+                        future.add_done_callback(chunk_done(chunk_callback, chunk, progress))
+                    future.add_done_callback(progress.on_done)
+                    window.track(future, chunk)
+
+                results = sorted((index, start, end, future.result()) for index, start, end, future in futures)
+                if progress.error:
+                    raise progress.error
+            except BaseException:
+                for *_, future in futures:
+                    future.cancel()
+                raise
+        progress.finish()
+
+        # Cloud API requires more params for segments, so overlaps are aligned on text alone
+        return merge_chunks(
+            {"start": start, "end": end, "text": text, "segments": []}
+            for _, start, end, text in results
+        )
+
+    def _transcribe_chunk(self, chunk):
+        # In-memory PCM chunks are uploaded as WAV built on the fly
+        wav = ("chunk_%03d.wav" % chunk.index, _pcm_to_wav(chunk.audio)) if chunk.audio is not None else None
+        size = len(wav[1]) if wav else os.path.getsize(chunk.path)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                BYTES_PROCESSED.inc(size, kind="cloud_upload")
+                if wav:
+                    transcript = self.client.audio.transcriptions.create(model=self.model, file=wav)
+                else:
+                    with open(chunk.path, "rb") as f:
+                        transcript = self.client.audio.transcriptions.create(
+                            model=self.model,
+                            file=f
+                        )
+                # Includes retries and backoff: the time the chunk really took
+                chunk.transcribe_seconds = time.perf_counter() - started
+                return transcript.text
+            except self.RETRYABLE_ERRORS as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                print(f"[CLOUD] {type(e).__name__} en chunk {chunk.index}, reintento {attempt}/{self.max_retries} en {delay:.1f}s")
+                time.sleep(delay)
+
+    def _backoff_delay(self, attempt, error):
+        # Honor Retry-After when the server sends it (typical on 429)
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass
+
+        # Full jitter: uniform in [0, base * 2^(attempt-1)], capped
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+def _pcm_to_wav(audio):
+    """
+    16-bit mono WAV bytes from float32 samples at SAMPLE_RATE.
+    """
+    samples = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
@@ -0,0 +1,117 @@
+import heapq
+import os
+import sqlite3
+import threading
+import time
+
+# Processing seconds per second of audio assumed until a configuration has finished a job
+DEFAULT_RTF = 0.2
+
+# Weight of the newest job in the rolling estimate (exponential moving average)
+SMOOTHING = 0.3
+
+# Shorter jobs are dominated by fixed costs (model load, probe) and say little about throughput
+MIN_SAMPLE_SECONDS = 30
+
+
+class ThroughputModel:
+    """
+    Learned processing speed per (mode, model, workers), persisted in SQLite.
+
+    Each completed job updates a rolling real-time factor (wall seconds per
+    audio second) and a rolling job length for its configuration, so ETAs
+    follow the actual hardware, model size and load instead of a fixed ratio.
+    """
+
+    def __init__(self, db_path="jobs.db"):
+        directory = os.path.dirname(db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS throughput ("
+                " mode TEXT, model TEXT, workers INTEGER, rtf REAL, job_seconds REAL,"
+                " samples INTEGER, updated_at REAL, PRIMARY KEY (mode, model, workers))"
+            )
+        self._cache = {
+            (mode, model, workers): (rtf, job_seconds, samples)
+            for mode, model, workers, rtf, job_seconds, samples in self._conn.execute(
+                "SELECT mode, model, workers, rtf, job_seconds, samples FROM throughput"
+            )
+        }
+
+    def rtf(self, mode, model, workers):
+        entry = self._cache.get((mode, model, workers))
+        return entry[0] if entry else DEFAULT_RTF
+
+    def estimate(self, mode, model, workers, duration=None):
+        """
+        Predicted processing seconds for a job. Without a known duration,
+        the typical length of past jobs for the configuration (or None).
+        """
+        if duration:
+            return duration * self.rtf(mode, model, workers)
+        entry = self._cache.get((mode, model, workers))
+        return entry[1] if entry else None
+
+    def remaining(self, mode, model, workers, duration, audio_done, elapsed):
+        """
+        Seconds left for a running job that has transcribed audio_done of its
+        duration seconds of audio in elapsed seconds. The job's own speed
+        takes over from the learned one as it progresses.
+        """
+        learned = self.rtf(mode, model, workers)
+        if not duration:
+            return None
+        progress = min(audio_done / duration, 1.0)
+        rtf = learned
+        if audio_done > 0 and elapsed > 0:
+            rtf = (1 - progress) * learned + progress * (elapsed / audio_done)
+        return max(duration - audio_done, 0) * rtf
+
+    def record(self, mode, model, workers, duration, seconds):
+        """
+        Folds a completed job (duration seconds of audio processed in seconds) into the estimate.
+        """
+        if not duration or duration < MIN_SAMPLE_SECONDS or seconds <= 0:
+            return
+        key = (mode, model, workers)
+        with self._lock:
+            previous = self._cache.get(key)
+            if previous is None:
+                rtf, job_seconds, samples = seconds / duration, seconds, 1
+            else:
+                rtf = (1 - SMOOTHING) * previous[0] + SMOOTHING * (seconds / duration)
+                job_seconds = (1 - SMOOTHING) * previous[1] + SMOOTHING * seconds
+                samples = previous[2] + 1
+            self._cache[key] = (rtf, job_seconds, samples)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO throughput"
+                    " (mode, model, workers, rtf, job_seconds, samples, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (mode, model, workers, rtf, job_seconds, samples, time.time())
+                )
+
+    def snapshot(self):
+        return [
+            {"mode": mode, "model": model, "workers": workers, "rtf": round(rtf, 4),
+             "job_seconds": round(job_seconds, 1), "samples": samples}
+            for (mode, model, workers), (rtf, job_seconds, samples) in sorted(self._cache.items())
+        ]
+
+
+def predict_queue_wait(active_remaining, queued_estimates, workers):
+    """
+    Seconds until a job gets a worker, given the remaining seconds of the jobs
+    running now and the estimates of the jobs queued ahead of it (in order),
+    with each job taking the first worker to free up.
+    """
+    free_at = sorted(active_remaining)[:workers]
+    free_at += [0.0] * (workers - len(free_at))
+    heapq.heapify(free_at)
+    for estimate in queued_estimates:
+        heapq.heappush(free_at, heapq.heappop(free_at) + estimate)
+    return free_at[0]
@@ -1,35 +1,109 @@
+import itertools
+import json
 import os
 
+# Seconds of speech per paragraph in the Markdown transcript
+MARKDOWN_PARAGRAPH_SECONDS = 60
+
+
+def _timestamp(ms, separator):
+    hours, ms = divmod(int(ms), 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
 class ExportService:
+    """
+    Transcript exports generated on demand from stored segments.
+
+    Every format is a generator of text parts that consumes segments (dicts
+    with start_ms, end_ms and text, in order) one at a time, so a response or
+    file can be written as it is produced and memory use doesn't depend on
+    the length of the transcript.
+    """
+
+    # format -> (media type, file extension)
+    FORMATS = {
+        "srt": ("application/x-subrip", "srt"),
+        "vtt": ("text/vtt", "vtt"),
+        "jsonl": ("application/x-ndjson", "jsonl"),
+        "md": ("text/markdown", "md"),
+    }
+
     def __init__(self, output_dir="uploads"):
         self.output_dir = output_dir
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
+    def stream(self, fmt, segments, analysis=None, metadata=None):
+        if fmt == "srt":
+            return self.to_srt(segments)
+        if fmt == "vtt":
+            return self.to_vtt(segments)
+        if fmt == "jsonl":
+            return self.to_jsonl(segments)
+        if fmt == "md":
+            return self.markdown_parts(segments, analysis, metadata)
+        raise ValueError(f"Formato de exportación no válido: {fmt}")
+
+    def to_srt(self, segments):
+        for n, seg in enumerate(segments, 1):
+            yield f"{n}\n{_timestamp(seg['start_ms'], ',')} --> {_timestamp(seg['end_ms'], ',')}\n{seg['text']}\n\n"
+
+    def to_vtt(self, segments):
+        yield "WEBVTT\n\n"
+        for seg in segments:
+            yield f"{_timestamp(seg['start_ms'], '.')} --> {_timestamp(seg['end_ms'], '.')}\n{seg['text']}\n\n"
+
+    def to_jsonl(self, segments):
+        for seg in segments:
+            line = {"start": seg["start_ms"] / 1000, "end": seg["end_ms"] / 1000, "text": seg["text"]}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    def markdown_parts(self, segments, analysis=None, metadata=None):
+        """
+        Markdown optimized for NotebookLM: header, optional analysis, and the
+        transcript in paragraphs of about a minute, each with its start time.
+        """
+        yield from self._markdown_header(analysis, metadata)
+        paragraph, paragraph_start = [], None
+        for seg in segments:
+            if paragraph_start is None:
+                paragraph_start = seg["start_ms"]
+            paragraph.append(seg["text"])
+            if seg["end_ms"] - paragraph_start >= MARKDOWN_PARAGRAPH_SECONDS * 1000:
+                yield f"\n**[{_timestamp(paragraph_start, '.')[:8]}]** {' '.join(paragraph)}\n"
+                paragraph, paragraph_start = [], None
+        if paragraph:
+            yield f"\n**[{_timestamp(paragraph_start, '.')[:8]}]** {' '.join(paragraph)}\n"
+
+    def _markdown_header(self, analysis=None, metadata=None):
+        if metadata:
+            yield f"# {metadata.get('title', 'Transcripción de Clase')}\n"
+            yield f"**Fecha**: {metadata.get('date', 'N/A')}\n"
+            yield "\n---\n"
+
+        if analysis:
+            yield "\n## 🧠 Análisis e Inteligencia\n"
+            yield analysis + "\n"
+            yield "\n---\n"
+
+        yield "\n## 📝 Transcripción Completa\n"
+
     def to_markdown(self, filename, transcript, analysis=None, metadata=None):
         """
-        Generates a Markdown file optimized for NotebookLM.
+        Writes the NotebookLM Markdown file for a plain-text transcript.
         """
         if not filename.endswith(".md"):
             filename += ".md"
-            
+
         path = os.path.join(self.output_dir, filename)
-        
-        content = []
-        if metadata:
-            content.append(f"# {metadata.get('title', 'Transcripción de Clase')}")
-            content.append(f"**Fecha**: {metadata.get('date', 'N/A')}")
-            content.append("\n---")
-            
-        if analysis:
-            content.append("\n## 🧠 Análisis e Inteligencia")
-            content.append(analysis)
-            content.append("\n---")
-            
-        content.append("\n## 📝 Transcripción Completa")
-        content.append(transcript)
-        
+        parts = self._markdown_header(analysis, metadata)
+        return self.write(path, itertools.chain(parts, [transcript]))
+
+    def write(self, path, parts):
         with open(path, "w", encoding="utf-8") as f:
-            f.write("\n".join(content))
-            
+            for part in parts:
+                f.write(part)
         return path
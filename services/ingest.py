@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import threading
+
+import ffmpeg
+
+# Bytes gathered in memory before each disk write
+WRITE_BLOCK_SIZE = 8 * 1024 * 1024
+
+# Head of the upload handed to ffprobe to read the duration before the rest arrives
+PROBE_BYTES = 4 * 1024 * 1024
+
+
+class IngestAborted(Exception):
+    """
+    The upload being followed stopped before it was complete.
+    """
+
+
+class StreamingIngest:
+    """
+    Writes an upload to disk as its bytes arrive, hashing on the fly and
+    probing the duration from the first PROBE_BYTES. While the upload is still
+    running, follow() yields the file's content as it grows so ffmpeg can be
+    fed through a pipe and start extracting audio before the upload ends.
+
+    write()/finish() are coroutines for the receiving request; blocking work
+    (disk writes, ffprobe) runs in threads so the event loop is never stalled.
+    """
+
+    def __init__(self, path, ffprobe_path="ffprobe"):
+        self.path = path
+        self.ffprobe_path = ffprobe_path
+        self.bytes_written = 0
+        self.duration = None
+        self.probe = None
+        self.streamable = False
+        self.done = False
+        self.error = None
+        self._digest = hashlib.sha256()
+        self._pending = bytearray()
+        self._probed = False
+        self._file = open(path, "wb")
+        self._cond = threading.Condition()
+
+    @property
+    def content_hash(self):
+        return self._digest.hexdigest()
+
+    async def write(self, data):
+        self._pending += data
+        if len(self._pending) >= WRITE_BLOCK_SIZE:
+            await self._flush()
+        if not self._probed and self.bytes_written >= PROBE_BYTES:
+            await self._probe_head()
+
+    async def finish(self):
+        await self._flush()
+        await asyncio.to_thread(self._file.close)
+        if not self._probed:
+            await self._probe_head()
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def abort(self, error):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+        self._file.close()
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        block = bytes(self._pending)
+        self._pending.clear()
+        await asyncio.to_thread(self._write_block, block)
+
+    def _write_block(self, block):
+        # hashlib releases the GIL on large buffers, so this overlaps with the receive loop
+        self._digest.update(block)
+        self._file.write(block)
+        self._file.flush()
+        with self._cond:
+            self.bytes_written += len(block)
+            self._cond.notify_all()
+
+    async def _probe_head(self):
+        self._probed = True
+        self.probe = await asyncio.to_thread(self._probe)
+        self.streamable = self.probe is not None
+        duration = (self.probe or {}).get("format", {}).get("duration")
+        self.duration = float(duration) if duration else None
+
+    def _probe(self):
+        """
+        ffprobe result for the part of the file written so far, or None.
+        Containers with their index at the end (MP4 without faststart) can't be
+        probed from the head; those are not followed and are processed once
+        complete. The duration of formats timed from their bitrate (MP3) is a
+        lower bound until the upload ends.
+        """
+        try:
+            return ffmpeg.probe(self.path, cmd=self.ffprobe_path)
+        except (ffmpeg.Error, OSError):
+            return None
+
+    def wait(self):
+        """
+        Blocks until the upload has finished; raises IngestAborted if it failed.
+        """
+        with self._cond:
+            while not self.done:
+                self._cond.wait(timeout=1)
+            if self.error:
+                raise IngestAborted(str(self.error))
+
+    def follow(self, block_size=1024 * 1024):
+        """
+        Yields the file's bytes from the start, waiting for new data until the
+        upload finishes. Raises IngestAborted if the upload fails meanwhile.
+        """
+        with open(self.path, "rb") as f:
+            while True:
+                block = f.read(block_size)
+                if block:
+                    yield block
+                    continue
+                with self._cond:
+                    while not self.done and f.tell() >= self.bytes_written:
+                        self._cond.wait(timeout=1)
+                    if self.error:
+                        raise IngestAborted(str(self.error))
+                    if self.done and f.tell() >= self.bytes_written:
+                        return
@@ -0,0 +1,202 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from services.transcript_merge import merge_chunks
+
+
+class JobStore:
+    """
+    Durable job state backed by SQLite.
+    Jobs are stored as JSON documents; each transcribed chunk is recorded as
+    soon as it finishes so an interrupted job can resume where it stopped.
+    """
+
+    # States that mean the process died while the job was running
+    ACTIVE_STATES = ("queued", "processing")
+
+    def __init__(self, db_path="jobs.db"):
+        directory = os.path.dirname(db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self._listeners = []
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, created_at REAL, updated_at REAL, data TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " job_id TEXT, idx INTEGER, start REAL, end REAL, text TEXT, segments TEXT,"
+                " PRIMARY KEY (job_id, idx))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated ON jobs(updated_at)")
+
+    def add_listener(self, callback):
+        """
+        callback(job_id, changed_fields, job) runs after every update that
+        actually changes a value.
+        """
+        self._listeners.append(callback)
+
+    def create(self, job_id, **fields):
+        now = time.time()
+        fields['id'] = job_id
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, created_at, updated_at, data) VALUES (?, ?, ?, ?)",
+                (job_id, now, now, json.dumps(fields))
+            )
+        return fields
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def exists(self, job_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone() is not None
+
+    def update(self, job_id, **fields):
+        """
+        Merges fields into the stored job. Returns the updated job, or None if missing.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job, changed = self._write(job_id, json.loads(row[0]), fields)
+        self._notify(job_id, changed, job)
+        return job
+
+    def transition(self, job_id, from_states, **fields):
+        """
+        Like update(), but only if the job's status is one of from_states
+        (checked atomically). Returns the updated job, or None.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or json.loads(row[0]).get('status') not in from_states:
+                return None
+            job, changed = self._write(job_id, json.loads(row[0]), fields)
+        self._notify(job_id, changed, job)
+        return job
+
+    def _write(self, job_id, job, fields):
+        changed = {k: v for k, v in fields.items() if job.get(k) != v}
+        job.update(fields)
+        with self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET data = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(job), time.time(), job_id)
+            )
+        return job, changed
+
+    def _notify(self, job_id, changed, job):
+        if changed:
+            for listener in self._listeners:
+                try:
+                    listener(job_id, changed, job)
+                except Exception as e:
+                    print(f"[JOBS] Error en listener de {job_id}: {e}")
+
+    def save_chunk(self, job_id, index, start, end, text, segments=None):
+        # Only timing and text are kept from Whisper segments (tokens etc. are bulky)
+        slim = [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in segments or []]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunks (job_id, idx, start, end, text, segments) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, index, start, end, text, json.dumps(slim))
+            )
+
+    def get_chunks(self, job_id):
+        """
+        Completed chunks of a job in order, as dicts.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, start, end, text, segments FROM chunks WHERE job_id = ? ORDER BY idx",
+                (job_id,)
+            ).fetchall()
+        return [
+            {"index": idx, "start": start, "end": end, "text": text, "segments": json.loads(segments)}
+            for idx, start, end, text, segments in rows
+        ]
+
+    def chunks_since(self, job_id, cursor=0, limit=None):
+        """
+        Chunks stored after cursor (0: all) in the order they were saved, and
+        the cursor to ask from next time. A chunk saved again (resumed job)
+        comes back with its new content.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, idx, start, end, text, segments FROM chunks"
+                " WHERE job_id = ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                (job_id, cursor, limit if limit else -1)
+            ).fetchall()
+        chunks = [
+            {"index": idx, "start": start, "end": end, "text": text, "segments": json.loads(segments)}
+            for _, idx, start, end, text, segments in rows
+        ]
+        return chunks, rows[-1][0] if rows else cursor
+
+    def clear_chunks(self, job_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE job_id = ?", (job_id,))
+
+    def resume_point(self, job_id):
+        """
+        (index, start_seconds) of the first chunk without a result, and the set
+        of indices already done (parallel modes may finish chunks out of order).
+        """
+        chunks = self.get_chunks(job_id)
+        done = {c["index"] for c in chunks}
+        index = 0
+        start = 0.0
+        for chunk in chunks:
+            if chunk["index"] != index:
+                break
+            index += 1
+            start = chunk["end"]
+        return index, start, done
+
+    def assemble(self, job_id):
+        """
+        Full transcription of a job from its stored chunks (overlaps de-duplicated).
+        """
+        return merge_chunks(self.get_chunks(job_id))
+
+    def mark_interrupted(self):
+        """
+        Called at startup: jobs left running by a previous process can be resumed.
+        Uploads cut off by the restart can't, and are marked failed.
+        """
+        interrupted = []
+        with self._lock:
+            rows = self._conn.execute("SELECT id, data FROM jobs").fetchall()
+        for job_id, data in rows:
+            if json.loads(data).get('status') == 'uploading':
+                self.update(job_id, status='failed', stage='failed', error="Subida interrumpida")
+            elif json.loads(data).get('status') in self.ACTIVE_STATES:
+                self.update(job_id, status='interrupted', stage='interrupted')
+                interrupted.append(job_id)
+        return interrupted
+
+    def prune(self, max_age_seconds):
+        """
+        Deletes jobs (and their chunks) not updated within max_age_seconds.
+        """
+        cutoff = time.time() - max_age_seconds
+        with self._lock, self._conn:
+            ids = [r[0] for r in self._conn.execute("SELECT id FROM jobs WHERE updated_at < ?", (cutoff,))]
+            self._conn.executemany("DELETE FROM chunks WHERE job_id = ?", [(i,) for i in ids])
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+        return ids
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from services.metrics import LLM_CACHE_LOOKUPS
+from services.transcript_cache import TranscriptCache
+
+
+class ResponseCache(TranscriptCache):
+    """
+    Persistent cache of LLM answers, one JSON file per (transcript, prompt,
+    model, system message). Entries expire after ttl_seconds and the
+    directory is kept under max_bytes least recently used first.
+
+    get_or_compute() also coalesces identical requests in flight: callers
+    asking for a key that is already being computed wait for that result
+    instead of making their own upstream call. Callers that produce the
+    response themselves (streaming) join the same coalescing with begin()
+    and finish().
+    """
+
+    def __init__(self, cache_dir="cache/llm", max_bytes=64 * 1024 * 1024, ttl_seconds=7 * 24 * 3600):
+        super().__init__(cache_dir, max_bytes)
+        self.ttl_seconds = ttl_seconds
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(transcript, prompt, model, system_message):
+        digest = hashlib.sha256()
+        for part in (transcript, prompt, model, system_message):
+            # Length-prefixed so different splits of the same characters can't collide
+            data = part.encode("utf-8")
+            digest.update(f"{len(data)}:".encode("ascii"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+            if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                return None
+            os.utime(path, None)
+        return entry["response"]
+
+    def put(self, key, response):
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"created_at": time.time(), "response": response}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def get_or_compute(self, key, compute):
+        """
+        Cached response for key, or compute() run once however many callers
+        ask for the key at the same time. Failures are not cached.
+        """
+        response = self.get(key)
+        if response is not None:
+            LLM_CACHE_LOOKUPS.inc(result="hit")
+            return response
+
+        future, owner = self.begin(key)
+        if not owner:
+            LLM_CACHE_LOOKUPS.inc(result="coalesced")
+            return future.result()
+
+        try:
+            # A request that finished between the lookup and now already stored it
+            response = self.get(key)
+            if response is None:
+                LLM_CACHE_LOOKUPS.inc(result="miss")
+                response = compute()
+                self.put(key, response)
+            else:
+                LLM_CACHE_LOOKUPS.inc(result="hit")
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, response)
+        return response
+
+    def begin(self, key):
+        """
+        Claims the computation of key. Returns (future, owner): the owner
+        computes (and put()s) the response and settles it with finish(); any
+        other caller waits on the future (future.result(), or
+        asyncio.wrap_future() from a coroutine) instead of calling upstream.
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        return future, owner
+
+    def finish(self, key, future, response=None, error=None):
+        """
+        Settles a computation claimed with begin(): waiting callers get the
+        response, or error (failures are not cached).
+        """
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(response)
@@ -0,0 +1,51 @@
+import os
+
+# Containers accepted for upload: anything ffmpeg demuxes that usually carries speech
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".webm", ".avi", ".m4v", ".mpeg", ".mpg", ".ts", ".flv", ".wmv", ".3gp")
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".aac", ".wav", ".flac", ".ogg", ".oga", ".opus", ".wma", ".mka", ".amr")
+SUPPORTED_EXTENSIONS = VIDEO_EXTENSIONS + AUDIO_EXTENSIONS
+
+# Source codecs that can be cut into chunks without re-encoding:
+# codec -> (chunk extension, segment muxer format). All of them are formats
+# both Whisper (via ffmpeg) and the OpenAI API read directly.
+COPYABLE_CODECS = {
+    "mp3": ("mp3", "mp3"),
+    "aac": ("m4a", "ipod"),
+    "opus": ("ogg", "ogg"),
+    "vorbis": ("ogg", "ogg"),
+    "flac": ("flac", "flac"),
+    "pcm_s16le": ("wav", "wav"),
+}
+
+# Upload limit of the transcription API, with some margin for container overhead
+CLOUD_MAX_CHUNK_BYTES = 24 * 1024 * 1024
+
+
+def is_supported(filename):
+    return os.path.splitext(filename.lower())[1] in SUPPORTED_EXTENSIONS
+
+
+def audio_stream(probe):
+    """
+    The first audio stream of an ffprobe result, or None if there is none.
+    """
+    for stream in probe.get("streams", []):
+        if stream.get("codec_type") == "audio":
+            return stream
+    return None
+
+
+def copy_options(stream, segment_time, max_chunk_bytes=None):
+    """
+    (output_options, extension) to cut chunks by stream copy instead of
+    transcoding to MP3, or None if the codec (or its bitrate, when chunks must
+    fit in max_chunk_bytes) doesn't allow it.
+    """
+    if stream is None or stream.get("codec_name") not in COPYABLE_CODECS:
+        return None
+    extension, segment_format = COPYABLE_CODECS[stream["codec_name"]]
+    if max_chunk_bytes:
+        bit_rate = int(stream.get("bit_rate") or 0)
+        if not bit_rate or bit_rate * segment_time / 8 > max_chunk_bytes:
+            return None
+    return {"acodec": "copy", "segment_format": segment_format}, extension
@@ -0,0 +1,203 @@
+import gc
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import whisper
+
+from services.metrics import stage_timer
+
+# Precisions for local inference; "int8" names load as "<model>:int8"
+PRECISIONS = ("fp32", "int8")
+INT8_SUFFIX = ":int8"
+
+
+def variant_name(model_name, precision="fp32"):
+    """
+    Registry name of model_name at precision: each variant is loaded, cached
+    and learned from (speed, transcript cache) as a model of its own.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Precisión no válida: {precision}")
+    return model_name + INT8_SUFFIX if precision == "int8" else model_name
+
+
+def load_whisper(model_name, device=None):
+    """
+    Loads a Whisper model by registry name. Names ending in :int8 get their
+    linear layers (most of the compute and weights) quantized to int8 with
+    dynamic quantization, which runs on CPU only.
+    """
+    if not model_name.endswith(INT8_SUFFIX):
+        return whisper.load_model(model_name, device=device)
+
+    import torch
+    from whisper.model import Linear
+
+    model = whisper.load_model(model_name[:-len(INT8_SUFFIX)], device="cpu")
+    # Whisper's Linear only adds a dtype cast to nn.Linear's forward (a no-op in
+    # fp32); quantize_dynamic matches exact types, so make them plain nn.Linear
+    for module in model.modules():
+        if type(module) is Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class _ModelEntry:
+    def __init__(self, model, size_bytes):
+        self.model = model
+        self.size_bytes = size_bytes
+        # Whisper installs kv-cache hooks on the model while decoding,
+        # so a single instance can only run one transcribe() at a time.
+        self.use_lock = threading.Lock()
+        self.users = 0
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded Whisper models.
+    Each model size is loaded once and kept resident; least recently used
+    models are evicted when max_models or memory_budget_mb is exceeded.
+    """
+
+    def __init__(self, max_models=2, memory_budget_mb=None, device=None):
+        self.max_models = max_models
+        self.memory_budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        self.device = device
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, model_name):
+        """
+        Returns the loaded model, loading it on first use.
+        Callers that run inference should prefer use() so concurrent jobs
+        do not decode on the same instance at once.
+        """
+        return self._get_entry(model_name).model
+
+    @contextmanager
+    def use(self, model_name):
+        """
+        Context manager giving exclusive use of a model for inference.
+        The model cannot be evicted while it is in use.
+        """
+        entry = self._get_entry(model_name, reserve=True)
+        try:
+            with entry.use_lock:
+                yield entry.model
+        finally:
+            with self._lock:
+                entry.users -= 1
+            self._evict()
+
+    def preload(self, model_name):
+        """
+        Loads a model in a background thread (warm-up at startup).
+        """
+        def _load():
+            try:
+                self.get(model_name)
+                print(f"[MODELS] Modelo '{model_name}' precargado.")
+            except Exception as e:
+                print(f"[MODELS] Error precargando modelo '{model_name}': {e}")
+
+        thread = threading.Thread(target=_load, daemon=True)
+        thread.start()
+        return thread
+
+    def loaded_models(self):
+        with self._lock:
+            return list(self._models.keys())
+
+    def _get_entry(self, model_name, reserve=False):
+        with self._lock:
+            entry = self._models.get(model_name)
+            if entry is not None:
+                self._models.move_to_end(model_name)
+                if reserve:
+                    entry.users += 1
+                return entry
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        # Load outside the registry lock so other sizes stay available;
+        # the per-name lock makes concurrent first requests share one load.
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(model_name)
+                if entry is not None:
+                    self._models.move_to_end(model_name)
+                    if reserve:
+                        entry.users += 1
+                    return entry
+
+            print(f"[MODELS] Cargando modelo Whisper '{model_name}'...")
+            with stage_timer("model_load", mode="local"):
+                model = load_whisper(model_name, device=self.device)
+            entry = _ModelEntry(model, _model_size_bytes(model))
+
+            with self._lock:
+                self._models[model_name] = entry
+                if reserve:
+                    entry.users += 1
+
+        self._evict()
+        return entry
+
+    def _evict(self):
+        evicted = []
+        with self._lock:
+            for name in list(self._models.keys()):
+                if not self._over_budget():
+                    break
+                entry = self._models[name]
+                # Never evict a model in use or the most recently used one.
+                if entry.users > 0 or name == next(reversed(self._models)):
+                    continue
+                del self._models[name]
+                evicted.append(name)
+
+        if evicted:
+            print(f"[MODELS] Modelos liberados (LRU): {', '.join(evicted)}")
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+    def _over_budget(self):
+        if self.max_models and len(self._models) > self.max_models:
+            return True
+        if self.memory_budget:
+            total = sum(e.size_bytes for e in self._models.values())
+            return total > self.memory_budget and len(self._models) > 1
+        return False
+
+
+def _model_size_bytes(model):
+    # state_dict rather than parameters(): quantized layers keep their weights
+    # in packed params, which are neither parameters nor buffers
+    def size(value):
+        if isinstance(value, (tuple, list)):
+            return sum(size(v) for v in value)
+        if hasattr(value, "element_size"):
+            return value.numel() * value.element_size()
+        return 0
+    return sum(size(value) for value in model.state_dict().values())
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry(max_models=2, memory_budget_mb=None):
+    """
+    Returns the shared registry for this process, creating it on first call.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry(max_models=max_models, memory_budget_mb=memory_budget_mb)
+        return _registry
@@ -0,0 +1,37 @@
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+try:
+    import h2  # noqa: F401  (httpx only negotiates HTTP/2 when it is installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def create_clients(api_key, timeout=120, max_retries=2, max_connections=32,
+                   max_keepalive_connections=16, keepalive_expiry=60, base_url=None):
+    """
+    (OpenAI, AsyncOpenAI) pair for the whole app: same key, timeout and retry
+    policy, each on one connection pool with keep-alive (and HTTP/2 if the h2
+    package is installed), so cloud transcription and chat calls reuse their
+    TCP/TLS sessions instead of opening new ones per call.
+
+    max_connections should cover the busiest moment: simultaneous cloud
+    chunk uploads of all cloud jobs plus summary calls. base_url points both
+    clients at another OpenAI-compatible server (e.g. the local stub in
+    benchmarks/stub_openai_server.py); None keeps the SDK's default.
+    """
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry
+    )
+    client = OpenAI(
+        api_key=api_key, base_url=base_url, timeout=timeout, max_retries=max_retries,
+        http_client=DefaultHttpxClient(limits=limits, http2=HTTP2_AVAILABLE)
+    )
+    async_client = AsyncOpenAI(
+        api_key=api_key, base_url=base_url, timeout=timeout, max_retries=max_retries,
+        http_client=DefaultAsyncHttpxClient(limits=limits, http2=HTTP2_AVAILABLE)
+    )
+    return client, async_client
@@ -0,0 +1,127 @@
+import os
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from services.model_registry import get_model_registry
+from services.pipeline import ChunkProgress, SubmitWindow, chunk_done
+from services.transcript_merge import merge_chunks
+
+_worker_model_name = None
+
+
+def _init_worker(model_name, torch_threads):
+    """
+    Runs once in every worker process: splits CPU threads and loads the model.
+    """
+    global _worker_model_name
+    _worker_model_name = model_name
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+    get_model_registry(max_models=1).get(model_name)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _transcribe_chunk(index, audio, offset):
+    with get_model_registry().use(_worker_model_name) as model:
+        started = time.perf_counter()
+        result = model.transcribe(audio)
+        elapsed = time.perf_counter() - started
+
+    segments = []
+    for seg in result.get("segments", []):
+        seg["start"] += offset
+        seg["end"] += offset
+        segments.append(seg)
+    return index, result["text"], segments, elapsed
+
+
+class ParallelTranscriber:
+    """
+    Transcribes chunks across a pool of worker processes, each holding its own
+    loaded Whisper model. The pool is kept alive between jobs so models stay warm.
+    """
+
+    def __init__(self, model_name="base", workers=None):
+        cpu_count = os.cpu_count() or 1
+        self.model_name = model_name
+        self.workers = max(1, workers or cpu_count)
+        self.torch_threads = max(1, cpu_count // self.workers)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: torch is not fork-safe, and it is the only option on Windows
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.torch_threads)
+                )
+            return self._executor
+
+    def warm_up(self):
+        """
+        Starts the worker processes and loads the model in each of them.
+        """
+        executor = self._get_executor()
+        for future in [executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+
+    def transcribe(self, chunks, progress_callback=None, total=None, chunk_callback=None, max_pending=4):
+        """
+        Transcribes AudioChunk objects in parallel. chunks may be a lazy stream
+        (ChunkProducer): each chunk is submitted as soon as it arrives and a
+        worker is free, with at most max_pending more queued, and results are
+        reassembled in chunk order with their start offsets applied.
+        chunk_callback(chunk, text, segments) runs as each chunk finishes.
+        """
+        executor = self._get_executor()
+        progress = ChunkProgress(progress_callback, total)
+        window = SubmitWindow(self.workers + max_pending)
+        futures = []
+        spans = {}
+        try:
+            for chunk in window.feed(chunks):
+                if progress.error:
+                    break
+                future = executor.submit(_transcribe_chunk, chunk.index, chunk.source, chunk.start)
+                futures.append(future)
+                spans[chunk.index] = (chunk.start, chunk.end)
+                progress.submitted_one()
+                if chunk_callback:
+                    # Worker results are (index, text, segments, elapsed)
+                    future.add_done_callback(chunk_done(chunk_callback, chunk, progress, lambda result: result[1:]))
+                future.add_done_callback(progress.on_done)
+                window.track(future, chunk)
+
+            results = [future.result() for future in futures]
+            if progress.error:
+                raise progress.error
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        progress.finish()
+
+        results.sort(key=lambda r: r[0])
+        return merge_chunks(
+            {"start": spans[index][0], "end": spans[index][1], "text": text, "segments": chunk_segments}
+            for index, text, chunk_segments, _ in results
+        )
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,460 @@
+import csv
+import io
+import os
+import queue
+import threading
+import time
+
+import ffmpeg
+import numpy as np
+
+from services.chunk_planner import SilenceChunker
+
+
+class AudioChunk:
+    """
+    A piece of extracted audio and its position (in seconds) in the source file.
+    Either path points to an encoded file on disk, or audio holds 16 kHz mono
+    float32 samples in memory (PCM extraction mode).
+    """
+
+    def __init__(self, index, path, start=0.0, end=None, audio=None):
+        self.index = index
+        self.path = path
+        self.start = start
+        self.end = end
+        self.audio = audio
+        # Set by the transcriber: seconds spent transcribing this chunk
+        self.transcribe_seconds = None
+
+    @property
+    def source(self):
+        """
+        What to hand to model.transcribe(): the array if in memory, else the path.
+        """
+        return self.audio if self.audio is not None else self.path
+
+    def __repr__(self):
+        return f"AudioChunk({self.index}, {self.path!r}, start={self.start}, end={self.end})"
+
+
+def as_chunks(audio_files, segment_time=600):
+    """
+    Accepts AudioChunk objects or plain paths; paths get offsets of i * segment_time.
+    Works lazily so it can wrap a ChunkProducer.
+    """
+    for i, item in enumerate(audio_files):
+        if isinstance(item, AudioChunk):
+            yield item
+        else:
+            yield AudioChunk(i, item, i * segment_time, (i + 1) * segment_time)
+
+
+class ChunkProgress:
+    """
+    Thread-safe progress reporting for chunks that are submitted and completed
+    out of order. Reports (current_chunk, total_chunks) like the sequential loop,
+    where total is an estimate until the producer is exhausted.
+    """
+
+    def __init__(self, callback=None, total=None):
+        self.callback = callback
+        self.total = total or 0
+        self.submitted = 0
+        self.done = 0
+        self.error = None
+        self._lock = threading.Lock()
+
+    def submitted_one(self):
+        with self._lock:
+            self.submitted += 1
+            self.total = max(self.total, self.submitted)
+            first = self.submitted == 1
+        if first:
+            self._report()
+
+    def on_done(self, future):
+        with self._lock:
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                if self.error is None:
+                    self.error = future.exception()
+                return
+            self.done += 1
+        self._report()
+
+    def fail(self, error):
+        """
+        Records an error raised outside the futures (the first one wins).
+        """
+        with self._lock:
+            if self.error is None:
+                self.error = error
+
+    def finish(self):
+        with self._lock:
+            self.total = self.submitted
+        if self.callback and self.total:
+            self.callback(self.total, self.total)
+
+    def _report(self):
+        if not self.callback:
+            return
+        with self._lock:
+            current = min(self.done + 1, self.total)
+            total = self.total
+        self.callback(current, total)
+
+
+def chunk_done(chunk_callback, chunk, progress, unpack=lambda result: (result, [], None)):
+    """
+    Done-callback for a chunk's future that runs chunk_callback(chunk, text,
+    segments). unpack turns the future's result into (text, segments,
+    transcribe_seconds); the default fits futures that return the text alone.
+    """
+    def callback(future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        # Errors here would be swallowed by the executor; surface them via progress
+        try:
+            text, segments, seconds = unpack(future.result())
+            if seconds is not None:
+                chunk.transcribe_seconds = seconds
+            chunk_callback(chunk, text, segments)
+        except Exception as e:
+            progress.fail(e)
+    return callback
+
+
+class SubmitWindow:
+    """
+    Caps the chunks handed to an executor and not finished yet. Executors
+    queue work without limit, so a consumer submitting every chunk as it
+    arrives would drain the producer's bounded queue and hold the whole
+    recording in memory; waiting for a free slot before pulling the next
+    chunk keeps the backpressure on ffmpeg instead.
+    """
+
+    def __init__(self, size):
+        self._slots = threading.BoundedSemaphore(max(1, size))
+
+    def feed(self, chunks):
+        """
+        Yields chunks one at a time, each only once a slot is free.
+        Every chunk yielded must be passed to track() with its future.
+        """
+        iterator = iter(chunks)
+        while True:
+            self._slots.acquire()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                self._slots.release()
+                return
+            except BaseException:
+                self._slots.release()
+                raise
+            yield chunk
+
+    def track(self, future, chunk):
+        def release(_):
+            # Samples already went to the model; futures kept for the results
+            # would otherwise keep every chunk's audio alive through callbacks
+            chunk.audio = None
+            self._slots.release()
+        future.add_done_callback(release)
+
+
+_END = object()
+
+# Shorter tail segments (container padding) are not valid input for Whisper
+MIN_CHUNK_SECONDS = 0.1
+
+# Whisper's native input format
+SAMPLE_RATE = 16000
+
+# Upload size per second of audio: in-memory chunks go to the API as 16-bit
+# WAV, transcoded MP3 chunks (libmp3lame VBR) never exceed 320 kbit/s
+WAV_BYTES_PER_SECOND = SAMPLE_RATE * 2
+MP3_MAX_BYTES_PER_SECOND = 320000 // 8
+
+
+class _ChunkQueueProducer:
+    """
+    Runs an ffmpeg process in a background thread and yields the chunks it
+    produces through a bounded queue, so the consumer can start before ffmpeg
+    has finished with the whole file. Subclasses implement _produce().
+    """
+
+    def __init__(self, ffmpeg_path, input_path, segment_time=600, max_pending=4, start_offset=0.0, first_index=0,
+                 input_feed=None):
+        self.ffmpeg_path = ffmpeg_path
+        self.input_path = input_path
+        # Optional iterable of the input's bytes (e.g. an upload still arriving),
+        # piped to ffmpeg's stdin instead of letting it open input_path
+        self.input_feed = input_feed
+        self.segment_time = segment_time
+        # Resuming: seek to start_offset seconds and number chunks from first_index
+        self.start_offset = start_offset
+        self.first_index = first_index
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._stop = threading.Event()
+        self._process = None
+        self._thread = None
+        self._error = None
+        self._stderr = []
+        # Wall time of the ffmpeg process, once it has exited
+        self.extract_seconds = None
+
+    def __iter__(self):
+        self.start()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _END:
+                    break
+                yield item
+            if self._error:
+                raise self._error
+        finally:
+            self.close()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """
+        Stops ffmpeg if the consumer gave up before the end.
+        """
+        self._stop.set()
+        if self._process and self._process.poll() is None:
+            self._process.kill()
+
+    def _produce(self):
+        raise NotImplementedError
+
+    def _input(self):
+        source = 'pipe:0' if self.input_feed is not None else self.input_path
+        if self.start_offset:
+            return ffmpeg.input(source, ss=self.start_offset)
+        return ffmpeg.input(source)
+
+    def _spawn(self, stream):
+        piped = self.input_feed is not None
+        self._process = stream.run_async(cmd=self.ffmpeg_path, pipe_stdin=piped, pipe_stdout=True, pipe_stderr=True)
+        # Drain stderr so ffmpeg never blocks on a full pipe
+        drain = threading.Thread(target=lambda: self._stderr.append(self._process.stderr.read()), daemon=True)
+        drain.start()
+        if piped:
+            threading.Thread(target=self._feed, daemon=True).start()
+        return drain
+
+    def _feed(self):
+        try:
+            for block in self.input_feed:
+                if self._stop.is_set():
+                    break
+                self._process.stdin.write(block)
+        except BrokenPipeError:
+            # ffmpeg exited early; its return code reports why
+            pass
+        except Exception as e:
+            self._error = e
+            self._process.kill()
+        finally:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            drain = self._produce()
+            if drain is None:
+                return
+            self._process.wait()
+            self.extract_seconds = time.perf_counter() - started
+            drain.join()
+            if self._process.returncode != 0 and not self._stop.is_set() and self._error is None:
+                self._error = ffmpeg.Error('ffmpeg', None, b"".join(self._stderr))
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(_END, force=True)
+
+    def _put(self, item, force=False):
+        while True:
+            if self._stop.is_set() and not force:
+                return False
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                if force and self._stop.is_set():
+                    return False
+
+
+class ChunkProducer(_ChunkQueueProducer):
+    """
+    Runs the ffmpeg segment muxer and yields each chunk as soon as ffmpeg closes
+    it, so transcription can start before extraction of the whole file ends.
+    Chunks pass through a bounded queue between the two stages.
+    """
+
+    def __init__(self, ffmpeg_path, input_path, chunks_dir, segment_time=600,
+                 max_pending=4, output_options=None, extension="mp3", start_offset=0.0, first_index=0,
+                 input_feed=None):
+        super().__init__(ffmpeg_path, input_path, segment_time, max_pending, start_offset, first_index, input_feed)
+        self.chunks_dir = chunks_dir
+        self.extension = extension
+        self.output_options = output_options or {'acodec': 'libmp3lame', 'q:a': 4}
+
+    def start(self):
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        super().start()
+
+    def _produce(self):
+        pattern = os.path.join(self.chunks_dir, f"chunk_%03d.{self.extension}")
+        # Only the first audio stream is demuxed; video is never decoded
+        options = {'vn': None, 'map': '0:a:0'}
+        options.update(self.output_options)
+        stream = self._input().output(
+            pattern,
+            f='segment',
+            segment_time=str(self.segment_time),
+            segment_start_number=self.first_index,
+            # One CSV line (file,start,end) per segment, written when it is closed
+            segment_list='pipe:1',
+            segment_list_type='csv',
+            **options
+        ).overwrite_output()
+        drain = self._spawn(stream)
+
+        reader = csv.reader(io.TextIOWrapper(self._process.stdout, encoding="utf-8"))
+        for index, row in enumerate(reader, self.first_index):
+            if not row:
+                continue
+            name, start, end = row[0], float(row[1]), float(row[2])
+            if end - start < MIN_CHUNK_SECONDS:
+                continue
+            chunk = AudioChunk(
+                index,
+                os.path.join(self.chunks_dir, os.path.basename(name)),
+                self.start_offset + start,
+                self.start_offset + end
+            )
+            if not self._put(chunk):
+                return None
+        return drain
+
+
+class PcmChunkProducer(_ChunkQueueProducer):
+    """
+    Zero-disk extraction: decodes the input once to 16 kHz mono float32 PCM on
+    ffmpeg's stdout and yields in-memory chunks of segment_time seconds, which
+    Whisper takes directly as arrays (no MP3 encode, no second decode, no files).
+    The bounded queue holds at most max_pending chunks and ffmpeg blocks on the
+    pipe while the transcription stage catches up; memory stays bounded only if
+    the consumer also limits the chunks it takes (see SubmitWindow).
+    With overlap > 0 every chunk after the first also repeats the last overlap
+    seconds of the previous one, for merge_chunks() to de-duplicate.
+    """
+
+    def __init__(self, ffmpeg_path, input_path, segment_time=600, max_pending=4, start_offset=0.0, first_index=0,
+                 overlap=0.0, input_feed=None):
+        super().__init__(ffmpeg_path, input_path, segment_time, max_pending, start_offset, first_index, input_feed)
+        self.overlap = overlap
+
+    def _produce(self):
+        stream = self._input().output(
+            'pipe:1', format='f32le', acodec='pcm_f32le', ac=1, ar=SAMPLE_RATE, **{'vn': None, 'map': '0:a:0'}
+        )
+        drain = self._spawn(stream)
+
+        chunk_bytes = int(self.segment_time * SAMPLE_RATE) * 4
+        overlap_samples = int(self.overlap * SAMPLE_RATE)
+        previous = None
+        index = self.first_index
+        while True:
+            buffer = _read_exact(self._process.stdout, chunk_bytes)
+            # Keep whole samples only
+            usable = len(buffer) - len(buffer) % 4
+            if usable < MIN_CHUNK_SECONDS * SAMPLE_RATE * 4:
+                break
+            # bytearray-backed, so the array is writable for torch.from_numpy
+            audio = np.frombuffer(buffer, dtype=np.float32, count=usable // 4)
+            start = self.start_offset + (index - self.first_index) * self.segment_time
+            end = start + len(audio) / SAMPLE_RATE
+            if overlap_samples and previous is not None:
+                lead = previous[-overlap_samples:]
+                audio = np.concatenate((lead, audio))
+                start -= len(lead) / SAMPLE_RATE
+            previous = audio
+            chunk = AudioChunk(index, None, start, end, audio=audio)
+            if not self._put(chunk):
+                return None
+            index += 1
+            if usable < chunk_bytes:
+                break
+        return drain
+
+
+class SilenceChunkProducer(_ChunkQueueProducer):
+    """
+    Like PcmChunkProducer, but cuts chunks in pauses near segment_time seconds
+    (see SilenceChunker) and never yields long silent stretches, so Whisper
+    neither splits words at chunk borders nor spends time on dead air.
+    Chunk start/end are the real positions in the source file.
+    """
+
+    # Seconds of PCM read from ffmpeg per planner step
+    READ_SECONDS = 5
+
+    def __init__(self, ffmpeg_path, input_path, segment_time=600, max_pending=4, start_offset=0.0, first_index=0,
+                 input_feed=None, **planner_options):
+        super().__init__(ffmpeg_path, input_path, segment_time, max_pending, start_offset, first_index, input_feed)
+        self.planner_options = planner_options
+
+    def _produce(self):
+        stream = self._input().output(
+            'pipe:1', format='f32le', acodec='pcm_f32le', ac=1, ar=SAMPLE_RATE, **{'vn': None, 'map': '0:a:0'}
+        )
+        drain = self._spawn(stream)
+
+        chunker = SilenceChunker(SAMPLE_RATE, target_seconds=self.segment_time, **self.planner_options)
+        index = self.first_index
+        read_bytes = self.READ_SECONDS * SAMPLE_RATE * 4
+        while True:
+            buffer = _read_exact(self._process.stdout, read_bytes)
+            usable = len(buffer) - len(buffer) % 4
+            planned = chunker.feed(np.frombuffer(buffer, dtype=np.float32, count=usable // 4))
+            if usable < read_bytes:
+                planned += chunker.flush()
+            for start_sample, audio in planned:
+                if len(audio) < MIN_CHUNK_SECONDS * SAMPLE_RATE:
+                    continue
+                start = self.start_offset + start_sample / SAMPLE_RATE
+                chunk = AudioChunk(index, None, start, start + len(audio) / SAMPLE_RATE, audio=audio)
+                if not self._put(chunk):
+                    return None
+                index += 1
+            if usable < read_bytes:
+                break
+        return drain
+
+
+def _read_exact(pipe, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    read = 0
+    while read < size:
+        n = pipe.readinto(view[read:])
+        if not n:
+            break
+        read += n
+    del view
+    return buffer if read == size else buffer[:read]
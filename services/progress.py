@@ -0,0 +1,62 @@
+import asyncio
+import json
+import threading
+
+
+class ProgressBroker:
+    """
+    Fan-out of job progress events to Server-Sent Events subscribers.
+    publish() may be called from any thread (transcription workers); events
+    are handed to each subscriber's event loop thread-safely.
+    """
+
+    def __init__(self, max_queued=256):
+        self.max_queued = max_queued
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, job_id):
+        """
+        Must be called from the event loop that will consume the queue.
+        """
+        queue = asyncio.Queue(maxsize=self.max_queued)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append((loop, queue))
+        return queue
+
+    def unsubscribe(self, job_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(job_id, [])
+            self._subscribers[job_id] = [(l, q) for l, q in subscribers if q is not queue]
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    def has_subscribers(self, job_id):
+        with self._lock:
+            return job_id in self._subscribers
+
+    def publish(self, job_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, []))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, (event, data))
+            except RuntimeError:
+                # Loop already closed; the subscriber is gone
+                self.unsubscribe(job_id, queue)
+
+
+def _offer(queue, item):
+    # A slow client loses the oldest events rather than blocking publishers
+    if queue.full():
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+    queue.put_nowait(item)
+
+
+def format_sse(event, data):
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
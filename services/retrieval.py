@@ -0,0 +1,191 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+# Words per passage: enough context for an answer, small enough to send only what matters
+PASSAGE_WORDS = 120
+
+# Passages sent to the model for a question
+TOP_K = 8
+
+# BM25 parameters (the usual defaults)
+K1 = 1.5
+B = 0.75
+
+# Prompts that ask something about the content, rather than transforming all of it (summary, guide).
+# Accented interrogatives only: "que", "como", "cuando"... are just as often conjunctions
+QUESTION_WORDS = (
+    "qué", "cómo", "cuándo", "dónde", "por qué", "quién", "quiénes", "cuál", "cuáles", "cuánto", "cuánta",
+    "cuántos", "cuántas"
+)
+# English interrogatives, only at the start of the prompt
+LEADING_QUESTION_WORDS = ("what", "how", "why", "when", "where", "who", "which")
+# Asking for the whole content: always answered from the full transcript
+SUMMARY_WORDS = r"resum\w*|sintetiz\w*|gu[ií]a|tod[oa]s?|complet[oa]|summar\w*|overview|whole|entire"
+
+_QUESTION_RE = re.compile(r"(?<!\w)(?:" + "|".join(re.escape(w) for w in QUESTION_WORDS) + r")(?!\w)", re.IGNORECASE)
+_LEADING_RE = re.compile(r"^\W*(?:" + "|".join(LEADING_QUESTION_WORDS) + r")\b", re.IGNORECASE)
+_SUMMARY_RE = re.compile(r"\b(?:" + SUMMARY_WORDS + r")\b", re.IGNORECASE)
+
+# Content words of a question that must appear in the passages found for
+# retrieval to be trusted; below this the answer comes from the whole text
+MIN_TERM_COVERAGE = 0.5
+# Words that say nothing about the content being asked for
+STOPWORDS = {
+    "para", "como", "esta", "este", "estos", "estas", "sobre", "entre", "cual", "cuales", "donde", "cuando",
+    "porque", "quien", "cuanto", "cuantos", "segun", "clase", "texto", "transcripcion", "profesor", "habla",
+    "dice", "explica", "that", "what", "which", "with", "from", "this", "does", "about", "there", "they"
+}
+
+
+def is_question(prompt):
+    """
+    True for a specific question about the content; False for instructions
+    over the whole transcript ("resume toda la clase", "¿puedes hacer una guía?").
+    """
+    if _SUMMARY_RE.search(prompt):
+        return False
+    return bool(_QUESTION_RE.search(prompt) or _LEADING_RE.match(prompt))
+
+
+def tokenize(text):
+    """
+    Lowercase words without accents, so "Energía" and "energia" are the same term.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return re.findall(r"\w+", text)
+
+
+def build_passages(text, segments=None, passage_words=PASSAGE_WORDS):
+    """
+    Consecutive segments (or sentences, without segments) grouped into
+    passages of about passage_words words: dicts with start, end, text.
+    """
+    if segments:
+        units = [(seg["start"], seg["end"], seg["text"].strip()) for seg in segments if seg["text"].strip()]
+    else:
+        units = [(None, None, unit.strip()) for unit in re.split(r"(?<=[.!?…])\s+|\n+", text) if unit.strip()]
+
+    passages, current, words = [], [], 0
+    for unit in units:
+        current.append(unit)
+        words += len(unit[2].split())
+        if words >= passage_words:
+            passages.append(_passage(len(passages), current))
+            current, words = [], 0
+    if current:
+        passages.append(_passage(len(passages), current))
+    return passages
+
+
+def _passage(index, units):
+    return {"index": index, "start": units[0][0], "end": units[-1][1], "text": " ".join(unit[2] for unit in units)}
+
+
+class PassageIndex:
+    """
+    BM25 index over the passages of one transcript. Postings are NumPy
+    arrays per term, so a query is scored with a few vectorized operations
+    over the passages containing its terms.
+    """
+
+    def __init__(self, passages):
+        self.passages = passages
+        postings = {}
+        lengths = np.zeros(len(passages), dtype=np.float32)
+        for n, passage in enumerate(passages):
+            terms = tokenize(passage["text"])
+            lengths[n] = len(terms)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(n)
+                postings[term][1].append(count)
+
+        self._postings = {
+            term: (np.array(ids, dtype=np.int32), np.array(tfs, dtype=np.float32))
+            for term, (ids, tfs) in postings.items()
+        }
+        average = lengths.mean() if len(passages) else 1.0
+        # Per-passage part of the BM25 denominator, computed once
+        self._norm = K1 * (1 - B + B * lengths / max(average, 1.0))
+
+    def search(self, query, k=TOP_K):
+        """
+        The k best passages for query (best first), as (score, passage).
+        """
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        total = len(self.passages)
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            ids, tfs = self._postings[term]
+            idf = np.log(1 + (total - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tfs * (K1 + 1) / (tfs + self._norm[ids])
+        if k < total:
+            best = np.argpartition(-scores, k)[:k]
+        else:
+            best = np.arange(total)
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), self.passages[i]) for i in best if scores[i] > 0]
+
+
+class PassageIndexCache:
+    """
+    Recently used PassageIndex objects, keyed by job and transcript text (the
+    text can be edited in the UI), so follow-up questions don't rebuild them.
+    """
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, job_id, text, segments=None, passage_words=PASSAGE_WORDS):
+        key = (job_id, hashlib.sha1(text.encode("utf-8")).hexdigest(), passage_words)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                return index
+        index = PassageIndex(build_passages(text, segments, passage_words))
+        with self._lock:
+            self._entries[key] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+def term_coverage(query, results):
+    """
+    Fraction of the query's content words found in the passages of results.
+    """
+    terms = {term for term in tokenize(query) if len(term) > 3 and term not in STOPWORDS}
+    if not terms:
+        return 0.0
+    found = set()
+    for _, passage in results:
+        found.update(terms.intersection(tokenize(passage["text"])))
+    return len(found) / len(terms)
+
+
+def format_passages(results):
+    """
+    Passages in transcript order, each labelled with its time when known.
+    """
+    passages = sorted((passage for _, passage in results), key=lambda p: p["index"])
+    lines = []
+    for passage in passages:
+        if passage["start"] is not None:
+            minutes, seconds = divmod(int(passage["start"]), 60)
+            lines.append(f"[{minutes:02d}:{seconds:02d}] {passage['text']}")
+        else:
+            lines.append(passage["text"])
+    return "\n\n".join(lines)
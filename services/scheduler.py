@@ -0,0 +1,147 @@
+import heapq
+import itertools
+import threading
+import traceback
+
+
+class QueueFullError(Exception):
+    """
+    Raised by JobScheduler.submit when the queue for a mode is at its depth limit.
+    """
+
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class _ModeQueue:
+    def __init__(self, mode, workers):
+        self.mode = mode
+        self.workers = workers
+        self.heap = []
+        self.active = set()
+        self.user_vtime = {}
+        self.vtime = 0
+
+
+class JobScheduler:
+    """
+    Runs jobs on a fixed number of worker threads per transcription mode.
+
+    Waiting jobs are ordered by priority, then by per-user virtual time
+    (fair queuing: a user with many queued jobs is interleaved with others
+    instead of going first with all of them), then FIFO. submit() rejects
+    work with QueueFullError once max_queued jobs are waiting for a mode.
+    """
+
+    def __init__(self, workers_per_mode, max_queued=20, on_queue_change=None):
+        self.max_queued = max_queued
+        self.on_queue_change = on_queue_change
+        self._queues = {mode: _ModeQueue(mode, n) for mode, n in workers_per_mode.items()}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        for queue in self._queues.values():
+            for i in range(queue.workers):
+                thread = threading.Thread(
+                    target=self._worker, args=(queue,), name=f"{queue.mode}-worker-{i + 1}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, job_id, mode, fn, user=None, priority="normal"):
+        """
+        Queues fn() to run on a worker for mode. Returns the 1-based queue position.
+        """
+        if mode not in self._queues:
+            raise ValueError(f"Modo desconocido: {mode}")
+        queue = self._queues[mode]
+        with self._cond:
+            if len(queue.heap) >= self.max_queued:
+                raise QueueFullError(f"Cola '{mode}' llena ({self.max_queued} trabajos en espera)")
+
+            # Each job advances its user's virtual clock; idle users start at the current one
+            user_start = max(queue.user_vtime.get(user, 0), queue.vtime)
+            queue.user_vtime[user] = user_start + 1
+            key = (PRIORITIES.get(priority, PRIORITIES["normal"]), user_start, next(self._seq))
+            heapq.heappush(queue.heap, (key, job_id, user, fn))
+            position = self._position_locked(queue, job_id)
+            self._cond.notify_all()
+        self._notify(mode)
+        return position
+
+    def position(self, job_id):
+        """
+        1-based position among waiting jobs, or None if not queued.
+        """
+        with self._cond:
+            for queue in self._queues.values():
+                position = self._position_locked(queue, job_id)
+                if position:
+                    return position
+        return None
+
+    def queued_jobs(self, mode):
+        with self._cond:
+            return [entry[1] for entry in sorted(self._queues[mode].heap)]
+
+    def active_jobs(self, mode):
+        with self._cond:
+            return list(self._queues[mode].active)
+
+    def stats(self):
+        with self._cond:
+            return {
+                mode: {"workers": q.workers, "active": len(q.active), "queued": len(q.heap)}
+                for mode, q in self._queues.items()
+            }
+
+    def cancel(self, job_id):
+        with self._cond:
+            for queue in self._queues.values():
+                for entry in queue.heap:
+                    if entry[1] == job_id:
+                        queue.heap.remove(entry)
+                        heapq.heapify(queue.heap)
+                        return True
+        return False
+
+    def shutdown(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+    def _position_locked(self, queue, job_id):
+        for position, entry in enumerate(sorted(queue.heap), 1):
+            if entry[1] == job_id:
+                return position
+        return None
+
+    def _worker(self, queue):
+        while True:
+            with self._cond:
+                while not queue.heap and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                key, job_id, user, fn = heapq.heappop(queue.heap)
+                queue.vtime = max(queue.vtime, key[1])
+                queue.active.add(job_id)
+            self._notify(queue.mode)
+
+            try:
+                fn()
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self._cond:
+                    queue.active.discard(job_id)
+
+    def _notify(self, mode):
+        if self.on_queue_change:
+            try:
+                self.on_queue_change(mode)
+            except Exception as e:
+                print(f"[SCHEDULER] Error notificando cambio de cola: {e}")
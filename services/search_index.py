@@ -0,0 +1,156 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+class TranscriptIndex:
+    """
+    Archive of transcript segments with full-text search (SQLite FTS5).
+
+    Segments are indexed chunk by chunk while a job runs, so a transcript is
+    searchable before it finishes, and replaced by the final merged segments
+    (overlaps de-duplicated) when it completes. The archive lives in its own
+    database, so it outlives the pruning of old jobs.
+    """
+
+    def __init__(self, db_path="transcripts.db"):
+        directory = os.path.dirname(db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                " job_id TEXT PRIMARY KEY, title TEXT, created_at REAL, completed INTEGER DEFAULT 0)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                " id INTEGER PRIMARY KEY, job_id TEXT, chunk_idx INTEGER, start_ms INTEGER, end_ms INTEGER, text TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS segments_job ON segments(job_id, chunk_idx)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS segments_job_order ON segments(job_id, id)")
+            # External-content FTS table kept in sync with segments by triggers;
+            # diacritics are folded so "leccion" finds "lección"
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5("
+                " text, content='segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN"
+                " INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text); END"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN"
+                " INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text); END"
+            )
+
+    def register(self, job_id, title):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO transcripts (job_id, title, created_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(job_id) DO UPDATE SET title = excluded.title",
+                (job_id, title, time.time())
+            )
+
+    def add_chunk(self, job_id, index, segments):
+        """
+        Indexes (or re-indexes) the segments of one chunk, with absolute timestamps in seconds.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM segments WHERE job_id = ? AND chunk_idx = ?", (job_id, index))
+            self._insert(job_id, index, segments)
+
+    def replace(self, job_id, title, segments):
+        """
+        Final segments of a completed transcript, replacing what was indexed while it ran.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO transcripts (job_id, title, created_at, completed) VALUES (?, ?, ?, 1)"
+                " ON CONFLICT(job_id) DO UPDATE SET title = excluded.title, completed = 1",
+                (job_id, title, time.time())
+            )
+            self._conn.execute("DELETE FROM segments WHERE job_id = ?", (job_id,))
+            self._insert(job_id, None, segments)
+
+    def has(self, job_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM segments WHERE job_id = ? LIMIT 1", (job_id,)).fetchone() is not None
+
+    def iter_segments(self, job_id, batch_size=1000):
+        """
+        Yields a transcript's segments in order (start_ms, end_ms, text), a
+        batch at a time, so exports of long transcripts use constant memory.
+        """
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, start_ms, end_ms, text FROM segments WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?",
+                    (job_id, last_id, batch_size)
+                ).fetchall()
+            for row_id, start_ms, end_ms, text in rows:
+                yield {"start_ms": start_ms, "end_ms": end_ms, "text": text}
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def remove(self, job_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM segments WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM transcripts WHERE job_id = ?", (job_id,))
+
+    def _insert(self, job_id, index, segments):
+        self._conn.executemany(
+            "INSERT INTO segments (job_id, chunk_idx, start_ms, end_ms, text) VALUES (?, ?, ?, ?, ?)",
+            [
+                (job_id, index, round(seg["start"] * 1000), round(seg["end"] * 1000), seg["text"].strip())
+                for seg in segments if seg["text"].strip()
+            ]
+        )
+
+    def search(self, query, limit=20, offset=0, job_id=None):
+        """
+        Segments matching all words of query (a trailing * matches a prefix),
+        best BM25 rank first, with their time offsets in milliseconds.
+        """
+        match = self._match_expression(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT s.job_id, t.title, s.start_ms, s.end_ms, s.text,"
+            " snippet(segments_fts, 0, '[', ']', '…', 16), bm25(segments_fts)"
+            " FROM segments_fts"
+            " JOIN segments s ON s.id = segments_fts.rowid"
+            " JOIN transcripts t ON t.job_id = s.job_id"
+            " WHERE segments_fts MATCH ?"
+        )
+        params = [match]
+        if job_id:
+            sql += " AND s.job_id = ?"
+            params.append(job_id)
+        sql += " ORDER BY bm25(segments_fts) LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {"job_id": job, "title": title, "start_ms": start, "end_ms": end,
+             "text": text, "snippet": snippet, "score": round(-score, 4)}
+            for job, title, start, end, text, snippet, score in rows
+        ]
+
+    @staticmethod
+    def _match_expression(query):
+        # Every word as a quoted phrase so user input can't break the FTS5 syntax
+        terms = []
+        for word in re.findall(r"[\w*]+", query):
+            prefix = word.endswith("*")
+            word = word.strip("*")
+            if word:
+                terms.append(f'"{word}"' + ("*" if prefix else ""))
+        return " ".join(terms)
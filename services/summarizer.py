@@ -0,0 +1,251 @@
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from services.metrics import LLM_CACHE_LOOKUPS
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Transcript tokens per model call: fits small-context models with room for prompt and answer
+PIECE_TOKENS = 6000
+
+# Simultaneous map calls per request
+MAX_CONCURRENCY = 4
+
+# Cap on each partial summary, so map latency and the size of the reduce input stay bounded
+PARTIAL_MAX_TOKENS = 700
+
+MAP_PROMPT = (
+    "Contexto: El siguiente es el fragmento {index} de {total} de un texto transcrito.\n\n"
+    "Fragmento:\n{text}\n\n"
+    "Instrucción del usuario: {instruction}\n\n"
+    "Extrae de forma concisa todo lo de este fragmento que sea relevante para la instrucción "
+    "(ideas, datos, definiciones, ejemplos). No respondas aún a la instrucción completa."
+)
+
+REDUCE_PROMPT = (
+    "Contexto: Las siguientes son notas extraídas, en orden, de los fragmentos consecutivos "
+    "de un texto transcrito largo.\n\n"
+    "Notas:\n{text}\n\n"
+    "Instrucción del usuario: {instruction}\n\n"
+    "Por favor, responde a la instrucción basándote en las notas, como si hubieras leído el texto completo."
+)
+
+_encoding = None
+
+
+def count_tokens(text):
+    """
+    Tokens of text for the chat models; about 4 characters per token if
+    tiktoken (or its vocabulary) is not available.
+    """
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def _units(text, segments):
+    """
+    Smallest pieces the transcript may be cut at: its segments, or its sentences.
+    """
+    if segments:
+        return [seg["text"].strip() for seg in segments if seg["text"].strip()]
+    return [unit for unit in re.split(r"(?<=[.!?…])\s+|\n+", text) if unit.strip()]
+
+
+def split_pieces(text, budget, segments=None):
+    """
+    Packs consecutive segments (or sentences) into pieces of at most budget
+    tokens. A single unit longer than the budget is cut by words.
+    """
+    pieces, current, used = [], [], 0
+    for unit in _units(text, segments):
+        tokens = count_tokens(unit)
+        if tokens > budget:
+            words = unit.split()
+            step = max(len(words) * budget // tokens, 1)
+            parts = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        else:
+            parts = [unit]
+        for part in parts:
+            tokens = count_tokens(part) if len(parts) > 1 else tokens
+            if current and used + tokens > budget:
+                pieces.append(" ".join(current))
+                current, used = [], 0
+            current.append(part)
+            used += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+class MapReduceSummarizer:
+    """
+    Answers an instruction over a transcript of any length.
+
+    A transcript that fits in piece_tokens goes to the model in one call, as
+    before. A longer one is split on segment boundaries into pieces that are
+    summarized concurrently (map, at most max_concurrency calls at a time);
+    the partial summaries are then combined into the answer (reduce), first
+    condensing them in groups if together they still don't fit.
+
+    client is anything with the chat.completions.create() of the OpenAI SDK,
+    so a local stub can stand in for the API; async_client (AsyncOpenAI or a
+    stub) is needed only for stream(). With a ResponseCache, repeated and
+    concurrent identical requests share one answer.
+    """
+
+    def __init__(self, client, system_message, piece_tokens=PIECE_TOKENS,
+                 max_concurrency=MAX_CONCURRENCY, partial_max_tokens=PARTIAL_MAX_TOKENS, cache=None,
+                 async_client=None):
+        self.client = client
+        self.async_client = async_client
+        self.system_message = system_message
+        self.piece_tokens = piece_tokens
+        self.max_concurrency = max_concurrency
+        self.partial_max_tokens = partial_max_tokens
+        self.cache = cache
+
+    def run(self, text, instruction, model, final_prompt, segments=None):
+        """
+        final_prompt(text, instruction) builds the user message for a
+        transcript that fits in a single call.
+        """
+        if self.cache is None:
+            return self._run(text, instruction, model, final_prompt, segments)
+        key = self.cache.make_key(text, instruction, model, self.system_message)
+        return self.cache.get_or_compute(key, lambda: self._run(text, instruction, model, final_prompt, segments))
+
+    async def stream(self, text, instruction, model, final_prompt, segments=None):
+        """
+        Async generator of the answer's text as the model produces it. The map
+        calls run first (concurrently, without blocking the event loop); only
+        the final call is streamed. Cached answers, and answers to an identical
+        request already in flight (streamed or not), come back as a single part.
+        """
+        key = self.cache.make_key(text, instruction, model, self.system_message) if self.cache else None
+        if key is None:
+            async for part in self._stream(text, instruction, model, final_prompt, segments):
+                yield part
+            return
+
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            LLM_CACHE_LOOKUPS.inc(result="hit")
+            yield cached
+            return
+        future, owner = self.cache.begin(key)
+        if not owner:
+            LLM_CACHE_LOOKUPS.inc(result="coalesced")
+            yield await asyncio.wrap_future(future)
+            return
+
+        parts = []
+        try:
+            # A request that finished between the lookup and now already stored it
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                LLM_CACHE_LOOKUPS.inc(result="hit")
+                self.cache.finish(key, future, cached)
+                yield cached
+                return
+            LLM_CACHE_LOOKUPS.inc(result="miss")
+            async for part in self._stream(text, instruction, model, final_prompt, segments):
+                parts.append(part)
+                yield part
+            response = "".join(parts)
+            await asyncio.to_thread(self.cache.put, key, response)
+        except BaseException as e:
+            # A client that disconnects cancels this stream; the others waiting
+            # on it get an error (not a cancellation of their own)
+            error = e if isinstance(e, Exception) else RuntimeError("La respuesta en curso se interrumpió")
+            self.cache.finish(key, future, error=error)
+            raise
+        self.cache.finish(key, future, response)
+
+    async def _stream(self, text, instruction, model, final_prompt, segments):
+        if count_tokens(text) <= self.piece_tokens:
+            prompt = final_prompt(text, instruction)
+        else:
+            notes = await self._amap(split_pieces(text, self.piece_tokens, segments), instruction, model)
+            while self._needs_reduce(notes):
+                groups = self._group(notes)
+                if len(groups) >= len(notes):
+                    break
+                notes = await self._amap(groups, instruction, model)
+            prompt = REDUCE_PROMPT.format(text="\n\n".join(notes), instruction=instruction)
+
+        response = await self.async_client.chat.completions.create(
+            model=model, messages=self._messages(prompt), stream=True
+        )
+        async for event in response:
+            delta = event.choices[0].delta.content if event.choices else None
+            if delta:
+                yield delta
+
+    def _run(self, text, instruction, model, final_prompt, segments):
+        if count_tokens(text) <= self.piece_tokens:
+            return self._complete(model, final_prompt(text, instruction))
+
+        pieces = split_pieces(text, self.piece_tokens, segments)
+        notes = self._map(pieces, instruction, model)
+        # Hierarchical reduce: condense groups of notes until they fit in one call
+        while self._needs_reduce(notes):
+            groups = self._group(notes)
+            if len(groups) >= len(notes):
+                break
+            notes = self._map(groups, instruction, model)
+        return self._complete(model, REDUCE_PROMPT.format(text="\n\n".join(notes), instruction=instruction))
+
+    def _needs_reduce(self, notes):
+        return count_tokens("\n\n".join(notes)) > self.piece_tokens
+
+    def _group(self, notes):
+        return split_pieces("", self.piece_tokens, [{"text": note} for note in notes])
+
+    def _map_prompts(self, pieces, instruction):
+        return [
+            MAP_PROMPT.format(index=n, total=len(pieces), text=piece, instruction=instruction)
+            for n, piece in enumerate(pieces, 1)
+        ]
+
+    def _messages(self, prompt):
+        return [
+            {"role": "system", "content": self.system_message},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _map(self, pieces, instruction, model):
+        prompts = self._map_prompts(pieces, instruction)
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(prompts))) as pool:
+            return list(pool.map(lambda prompt: self._complete(model, prompt, self.partial_max_tokens), prompts))
+
+    async def _amap(self, pieces, instruction, model):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def complete(prompt):
+            async with semaphore:
+                response = await self.async_client.chat.completions.create(
+                    model=model, messages=self._messages(prompt), max_tokens=self.partial_max_tokens
+                )
+            return response.choices[0].message.content
+
+        return await asyncio.gather(*(complete(prompt) for prompt in self._map_prompts(pieces, instruction)))
+
+    def _complete(self, model, prompt, max_tokens=None):
+        options = {"max_tokens": max_tokens} if max_tokens else {}
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=self._messages(prompt),
+            **options
+        )
+        return response.choices[0].message.content
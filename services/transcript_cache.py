@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import threading
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """
+    SHA-256 of a file's content, read in 1 MB blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """
+    Persistent, content-addressed cache of finished transcriptions.
+    One JSON file per (content hash, mode, model, language); files are evicted
+    least recently used first once the directory exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir="cache/transcripts", max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    @staticmethod
+    def make_key(content_hash, mode, model, language=None):
+        raw = f"{content_hash}|{mode}|{model}|{language or 'auto'}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+            # mtime doubles as last-access time for LRU eviction
+            os.utime(path, None)
+        return entry
+
+    def put(self, key, result):
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"text": result["text"], "segments": result.get("segments", [])}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        # Keep at least the newest entry even if it alone exceeds the budget
+        while total > self.max_bytes and len(entries) > 1:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
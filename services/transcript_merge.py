@@ -0,0 +1,186 @@
+import math
+import re
+
+# Shortest run of shared words trusted as the duplicated part of an overlap;
+# a shorter one (of 2 or more) only if it both ends A and starts B
+MIN_MATCH_WORDS = 3
+
+# Words at a chunk border that may be garbled (cut mid-word) and so not match;
+# also the margin added around the words estimated to fall in the overlap
+MAX_BORDER_WORDS = 4
+
+# Most words compared from each side when chunks have no segments (cloud mode)
+TEXT_WINDOW_WORDS = 80
+
+
+def _normalize(word):
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def _match(words_a, words_b):
+    """
+    (i, j, size) of the run of words shared by A (ending at the overlap) and
+    B (starting at it) that best explains the overlap, or None.
+
+    Only runs that end within MAX_BORDER_WORDS of the end of A or start within
+    MAX_BORDER_WORDS of the start of B are candidates, so a phrase that merely
+    repeats elsewhere can't be taken for the duplicate; the longest run
+    nearest to that border wins. A run shorter than MIN_MATCH_WORDS counts
+    only if it reaches both borders (give or take one garbled word each).
+    """
+    a = [_normalize(w) for w in words_a]
+    b = [_normalize(w) for w in words_b]
+    shortest = max(min(MIN_MATCH_WORDS, len(a), len(b)), 1)
+    short = min(2, shortest)
+    best, best_score = None, None
+    for i in range(len(a)):
+        for j in range(len(b)):
+            # Each run is considered once, from its first word
+            if not a[i] or a[i] != b[j] or (i and j and a[i - 1] == b[j - 1]):
+                continue
+            size = 1
+            while i + size < len(a) and j + size < len(b) and a[i + size] == b[j + size]:
+                size += 1
+            gap = len(a) - (i + size)
+            if min(gap, j) > MAX_BORDER_WORDS:
+                continue
+            if size < shortest and (size < short or gap > 1 or j > 1):
+                continue
+            score = size - gap - j
+            if best_score is None or score > best_score:
+                best, best_score = (i, j, size), score
+    return best
+
+
+def _split_words(segments):
+    """
+    Flattens segments into words, remembering which segment each word came
+    from and its estimated time (the segment's span spread evenly over its words).
+    """
+    words, owners, times = [], [], []
+    for n, seg in enumerate(segments):
+        seg_words = seg["text"].split()
+        step = (seg["end"] - seg["start"]) / len(seg_words) if seg_words else 0
+        for k, word in enumerate(seg_words):
+            words.append(word)
+            owners.append(n)
+            times.append(seg["start"] + (k + 0.5) * step)
+    return words, owners, times
+
+
+def _rebuild(segments, words, owners, keep):
+    """
+    Segments holding only the words whose index is in range keep (dropped if emptied).
+    """
+    texts = {}
+    for i in keep:
+        texts.setdefault(owners[i], []).append(words[i])
+    return [dict(seg, text=" " + " ".join(texts[n])) for n, seg in enumerate(segments) if n in texts]
+
+
+def _merge_segments(segments, right, overlap_start, overlap_end):
+    """
+    Appends the segments of a chunk that overlaps the previous one to segments
+    (in place) without repeating the words both transcribed in [overlap_start, overlap_end].
+    """
+    tail_from = len(segments)
+    while tail_from > 0 and segments[tail_from - 1]["end"] > overlap_start:
+        tail_from -= 1
+    head_to = next((n for n, seg in enumerate(right) if seg["start"] >= overlap_end), len(right))
+    left_tail = segments[tail_from:]
+    right_head, right_rest = right[:head_to], right[head_to:]
+
+    words_a, owners_a, times_a = _split_words(left_tail)
+    words_b, owners_b, times_b = _split_words(right_head)
+    # Only the words inside the overlap (plus a margin) are aligned, not whole long segments
+    first = next((k for k, t in enumerate(times_a) if t >= overlap_start), len(words_a))
+    first = max(first - MAX_BORDER_WORDS, 0)
+    last = next((k for k, t in enumerate(times_b) if t >= overlap_end), len(words_b))
+    last = min(last + MAX_BORDER_WORDS, len(words_b))
+    match = _match(words_a[first:], words_b[:last])
+    if match:
+        # Keep the left chunk up to the end of the shared words, the right one after them
+        i, j, size = match
+        i += first
+        tail = _rebuild(left_tail, words_a, owners_a, range(i + size))
+        head = _rebuild(right_head, words_b, owners_b, range(j + size, len(words_b)))
+    else:
+        # Nothing to align: each side keeps the segments centred on its half of the overlap
+        middle = (overlap_start + overlap_end) / 2
+        tail = [seg for seg in left_tail if (seg["start"] + seg["end"]) / 2 < middle]
+        head = [seg for seg in right_head if (seg["start"] + seg["end"]) / 2 >= middle]
+    segments[tail_from:] = tail + head + right_rest
+
+
+def _overlap_words(count, start, end, overlap):
+    """
+    Words of a chunk of count words spanning [start, end] that fall in overlap
+    seconds, assuming an even speaking rate.
+    """
+    if start is None or end is None or end <= start:
+        return min(count, TEXT_WINDOW_WORDS)
+    return min(math.ceil(count * overlap / (end - start)), count, TEXT_WINDOW_WORDS)
+
+
+def _merge_words(words, right, overlap_a, overlap_b):
+    """
+    Appends the words of an overlapping chunk to words (in place), aligning
+    on text alone (chunks without segments). overlap_a and overlap_b are the
+    words estimated to fall in the overlap at the end of words and at the
+    start of right.
+    """
+    tail_from = max(len(words) - overlap_a - MAX_BORDER_WORDS, 0)
+    match = _match(words[tail_from:], right[:overlap_b + MAX_BORDER_WORDS])
+    if match:
+        i, j, size = match
+        del words[tail_from + i + size:]
+        words.extend(right[j + size:])
+    else:
+        # Nothing to align: each side keeps its half of the overlap
+        del words[len(words) - overlap_a // 2:]
+        words.extend(right[(overlap_b + 1) // 2:])
+
+
+def merge_chunks(chunks):
+    """
+    Joins ordered chunk results (dicts with start, end, text and segments with
+    absolute timestamps) into {"text", "segments"}. Where a chunk starts before
+    the previous one ended, the duplicated words of the overlap are removed by
+    aligning the two transcriptions; contiguous chunks are simply concatenated.
+    """
+    segments = []
+    texts = []
+    words = []
+    overlapped = False
+    previous_start = previous_end = None
+    previous_count = 0
+    for chunk in chunks:
+        chunk_segments = [dict(seg) for seg in chunk.get("segments") or []]
+        chunk_words = chunk["text"].split()
+        overlap = previous_end is not None and chunk.get("start") is not None and chunk["start"] < previous_end
+
+        if overlap:
+            overlapped = True
+            seconds = previous_end - chunk["start"]
+            _merge_segments(segments, chunk_segments, chunk["start"], previous_end)
+            _merge_words(
+                words, chunk_words,
+                min(_overlap_words(previous_count, previous_start, previous_end, seconds), len(words)),
+                _overlap_words(len(chunk_words), chunk["start"], chunk.get("end"), seconds)
+            )
+        else:
+            segments.extend(chunk_segments)
+            words.extend(chunk_words)
+        texts.append(chunk["text"])
+
+        if chunk.get("end") is not None:
+            previous_start, previous_end = chunk.get("start"), chunk["end"]
+        previous_count = len(chunk_words)
+
+    if not overlapped:
+        text = " ".join(texts)
+    elif segments:
+        text = "".join(seg["text"] for seg in segments).strip()
+    else:
+        text = " ".join(words)
+    return {"text": text, "segments": segments}
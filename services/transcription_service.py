@@ -1,15 +1,33 @@
 import os
 import shutil
 import ffmpeg
-import whisper
 import time
 import sys
-from openai import OpenAI
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from services.model_registry import get_model_registry
+from services.openai_clients import create_clients
+from services.parallel_transcription import ParallelTranscriber
+from services.cloud_transcriber import CloudTranscriber
+from services.transcript_merge import merge_chunks
+from services.media import copy_options
+from services.pipeline import (
+    ChunkProducer, PcmChunkProducer, SilenceChunkProducer, as_chunks,
+    WAV_BYTES_PER_SECOND, MP3_MAX_BYTES_PER_SECOND
+)
 
 class TranscriptionService:
-    def __init__(self, api_key=None, ffmpeg_path=None):
-        self.client = OpenAI(api_key=api_key) if api_key else None
+    def __init__(self, api_key=None, ffmpeg_path=None, client=None, max_pools=1):
+        self.client = client or (create_clients(api_key)[0] if api_key else None)
         self.ffmpeg_path = ffmpeg_path or self._find_ffmpeg()
+        # Worker pools per (model, workers), least recently used first; each worker
+        # holds its own copy of the model, so idle pools beyond max_pools are shut down
+        self.max_pools = max(1, max_pools)
+        self._pools = OrderedDict()
+        self._pool_users = {}
+        self._pools_lock = threading.Lock()
         
     def _find_ffmpeg(self):
         # Look for ffmpeg.exe in current directory or script directory
@@ -46,53 +64,173 @@ class TranscriptionService:
             stderr = e.stderr.decode('utf8') if e.stderr else "No stderr"
             raise Exception(f"FFmpeg error: {stderr}")
 
-    def transcribe_local(self, audio_files, model_name="base", progress_callback=None):
-        model = whisper.load_model(model_name)
+    def get_parallel_transcriber(self, model_name="base", workers=None):
+        """
+        Returns the process pool for model_name, created once and reused across
+        jobs while it is among the max_pools most recently used.
+        """
+        key = (model_name, workers)
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = ParallelTranscriber(model_name, workers)
+            self._pools.move_to_end(key)
+        self._release_idle_pools()
+        return pool
+
+    @contextmanager
+    def _use_parallel_transcriber(self, model_name, workers):
+        """
+        Like get_parallel_transcriber(), but the pool can't be shut down while in use.
+        """
+        key = (model_name, workers)
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = ParallelTranscriber(model_name, workers)
+            self._pools.move_to_end(key)
+            self._pool_users[key] = self._pool_users.get(key, 0) + 1
+        self._release_idle_pools()
+        try:
+            yield pool
+        finally:
+            with self._pools_lock:
+                self._pool_users[key] -= 1
+                if not self._pool_users[key]:
+                    del self._pool_users[key]
+            self._release_idle_pools()
+
+    def _release_idle_pools(self):
+        released = []
+        with self._pools_lock:
+            for key in list(self._pools.keys()):
+                if len(self._pools) <= self.max_pools:
+                    break
+                # A pool busy with a job is released when the job ends
+                if key in self._pool_users or key == next(reversed(self._pools)):
+                    continue
+                released.append(self._pools.pop(key))
+        for pool in released:
+            print(f"[MODELS] Procesos de '{pool.model_name}' liberados (LRU).")
+            pool.shutdown()
+
+    def stream_audio_chunks(self, video_path, chunks_dir, segment_time=600, max_pending=4, extraction_mode="mp3",
+                            start_offset=0.0, first_index=0, chunking="fixed", overlap=0.0, input_feed=None,
+                            source_stream=None, max_chunk_bytes=None, **planner_options):
+        """
+        Pipelined alternative to extract_audio: returns a producer that yields
+        each AudioChunk as soon as ffmpeg has it ready.
+        extraction_mode "mp3" writes MP3 chunks to chunks_dir; "pcm" streams
+        16 kHz float32 samples into memory without writing any file.
+        chunking "silence" cuts in pauses near segment_time and skips long
+        silences (always in memory; planner_options go to SilenceChunker).
+        overlap > 0 (fixed chunking) makes each chunk repeat the last seconds
+        of the previous one so words cut at a border are heard whole; it needs
+        in-memory PCM, and the results must be joined with merge_chunks().
+        start_offset/first_index resume extraction partway through the file.
+        input_feed (an iterable of bytes, e.g. StreamingIngest.follow()) pipes
+        the input to ffmpeg while it is still being uploaded.
+        source_stream is the probed audio stream of the input: in "mp3" mode,
+        codecs that need no conversion are cut by stream copy instead of
+        being re-encoded (if chunks stay under max_chunk_bytes, when given).
+        max_chunk_bytes (cloud mode) also shortens chunks below segment_time
+        where their upload would exceed it; the producer's segment_time is
+        the length actually used.
+        """
+        if chunking == "silence":
+            if max_chunk_bytes:
+                # Chunks may run past segment_time up to max_seconds while looking for a pause
+                limit = max_chunk_bytes / WAV_BYTES_PER_SECOND
+                longest = planner_options.get("max_seconds") or segment_time * 1.25
+                planner_options["max_seconds"] = min(longest, limit)
+                segment_time = min(segment_time, limit)
+            return SilenceChunkProducer(
+                self.ffmpeg_path, video_path, segment_time, max_pending,
+                start_offset=start_offset, first_index=first_index, input_feed=input_feed, **planner_options
+            )
+        if extraction_mode == "pcm" or overlap > 0:
+            if max_chunk_bytes:
+                segment_time = min(segment_time, max_chunk_bytes / WAV_BYTES_PER_SECOND - overlap)
+            return PcmChunkProducer(
+                self.ffmpeg_path, video_path, segment_time, max_pending,
+                start_offset=start_offset, first_index=first_index, overlap=overlap, input_feed=input_feed
+            )
+        output_options, extension = copy_options(source_stream, segment_time, max_chunk_bytes) or (None, "mp3")
+        if max_chunk_bytes and output_options is None:
+            segment_time = min(segment_time, max_chunk_bytes / MP3_MAX_BYTES_PER_SECOND)
+        return ChunkProducer(
+            self.ffmpeg_path, video_path, chunks_dir, segment_time, max_pending,
+            output_options=output_options, extension=extension,
+            start_offset=start_offset, first_index=first_index, input_feed=input_feed
+        )
+
+    def transcribe_local(self, audio_files, model_name="base", progress_callback=None, workers=1, total=None,
+                         chunk_callback=None, max_pending=4):
+        """
+        audio_files: paths (assumed 600s segments) or AudioChunk objects with their
+        real start offsets (e.g. silence-aware chunks of varying length), possibly
+        a lazy stream from stream_audio_chunks(). total is the expected chunk
+        count when audio_files has no len(). chunk_callback(chunk, text, segments)
+        is called as each chunk finishes. With several workers, at most
+        max_pending chunks wait for a free one.
+        """
+        if total is None and hasattr(audio_files, "__len__"):
+            total = len(audio_files)
+        chunks = as_chunks(audio_files)
+
+        if workers and workers > 1 and total != 1:
+            with self._use_parallel_transcriber(model_name, workers) as pool:
+                return pool.transcribe(chunks, progress_callback, total, chunk_callback, max_pending)
+
         full_transcript = []
-        full_segments = []
         
-        total = len(audio_files)
-        for i, file in enumerate(audio_files):
+        count = 0
+        for chunk in chunks:
+            count += 1
+            total = max(total or 0, count)
             if progress_callback:
-                progress_callback(i + 1, total)
+                progress_callback(count, total)
                 
-            result = model.transcribe(file)
+            # Shared, already-loaded model; held only for the duration of this chunk
+            with get_model_registry().use(model_name) as model:
+                started = time.perf_counter()
+                result = model.transcribe(chunk.source)
+                chunk.transcribe_seconds = time.perf_counter() - started
             
-            # Adjust timestamps based on segment index
-            offset = i * 600 # assuming 600s segments
+            # Adjust timestamps based on where the chunk starts in the source
             for seg in result.get("segments", []):
-                seg["start"] += offset
-                seg["end"] += offset
-                full_segments.append(seg)
+                seg["start"] += chunk.start
+                seg["end"] += chunk.start
                 
-            full_transcript.append(result["text"])
+            full_transcript.append({"start": chunk.start, "end": chunk.end, "text": result["text"], "segments": result.get("segments", [])})
+            if chunk_callback:
+                chunk_callback(chunk, result["text"], result.get("segments", []))
+
+        if progress_callback and count:
+            progress_callback(count, count)
             
-        return {
-            "text": " ".join(full_transcript),
-            "segments": full_segments
-        }
+        # Overlapping chunks repeat words at their borders; merge_chunks drops the duplicates
+        return merge_chunks(full_transcript)
+
+    def shutdown(self):
+        with self._pools_lock:
+            for pool in self._pools.values():
+                pool.shutdown()
+            self._pools.clear()
 
-    def transcribe_cloud(self, audio_files, progress_callback=None):
+    def transcribe_cloud(self, audio_files, progress_callback=None, max_in_flight=4, timeout=120, max_retries=5,
+                         model="whisper-1", total=None, chunk_callback=None, max_pending=4):
         if not self.client:
             raise ValueError("OpenAI client not initialized (API Key missing)")
-            
-        full_transcript = []
-        
-        total = len(audio_files)
-        for i, file in enumerate(audio_files):
-            if progress_callback:
-                progress_callback(i + 1, total)
-                
-            with open(file, "rb") as f:
-                # Note: Whisper API doesn't return detailed segments easily with simple .create()
-                # for now we'll match original behavior but improve later if needed
-                transcript = self.client.audio.transcriptions.create(
-                    model="whisper-1", 
-                    file=f
-                )
-                full_transcript.append(transcript.text)
-                
-        return {
-            "text": " ".join(full_transcript),
-            "segments": [] # Cloud API requires more params for segments
-        }
+
+        # Note: Whisper API doesn't return detailed segments easily with simple .create()
+        transcriber = CloudTranscriber(
+            self.client,
+            model=model,
+            max_in_flight=max_in_flight,
+            timeout=timeout,
+            max_retries=max_retries
+        )
+        if total is None and hasattr(audio_files, "__len__"):
+            total = len(audio_files)
+        return transcriber.transcribe(as_chunks(audio_files), progress_callback, total, chunk_callback, max_pending)
@@ -0,0 +1,44 @@
+from services.transcript_merge import merge_chunks
+
+# 0-12 s and 10-22 s: the words said in 10-12 s are in both chunks
+LEFT = "lo que es la energía potencial se guarda y después hablamos de la cinética dijimos"
+RIGHT = "cinética dijimos entonces ahora vemos lo que es la energía en movimiento"
+EXPECTED = (
+    "lo que es la energía potencial se guarda y después hablamos de la cinética dijimos "
+    "entonces ahora vemos lo que es la energía en movimiento"
+)
+
+
+def _segment(start, end, text):
+    return {"start": start, "end": end, "text": " " + text}
+
+
+def test_text_overlap_ignores_phrase_repeated_outside_it():
+    merged = merge_chunks([
+        {"start": 0.0, "end": 12.0, "text": LEFT, "segments": []},
+        {"start": 10.0, "end": 22.0, "text": RIGHT, "segments": []},
+    ])
+    assert merged["text"] == EXPECTED
+
+
+def test_segment_overlap_ignores_phrase_repeated_outside_it():
+    merged = merge_chunks([
+        {"start": 0.0, "end": 12.0, "text": LEFT, "segments": [
+            _segment(0.0, 6.0, "lo que es la energía potencial se guarda"),
+            _segment(6.0, 12.0, "y después hablamos de la cinética dijimos"),
+        ]},
+        {"start": 10.0, "end": 22.0, "text": RIGHT, "segments": [
+            _segment(10.0, 16.0, "cinética dijimos entonces ahora vemos"),
+            _segment(16.0, 22.0, "lo que es la energía en movimiento"),
+        ]},
+    ])
+    assert merged["text"] == EXPECTED
+    assert [seg["start"] for seg in merged["segments"]] == [0.0, 6.0, 10.0, 16.0]
+
+
+def test_text_overlap_without_match_cuts_at_the_middle():
+    merged = merge_chunks([
+        {"start": 0.0, "end": 10.0, "text": "uno dos tres cuatro cinco seis siete ocho nueve diez", "segments": []},
+        {"start": 8.0, "end": 18.0, "text": "nueve diz once doce trece catorce quince dieciséis diecisiete dieciocho", "segments": []},
+    ])
+    assert merged["text"] == "uno dos tres cuatro cinco seis siete ocho nueve diz once doce trece catorce quince dieciséis diecisiete dieciocho"